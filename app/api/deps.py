@@ -2,7 +2,7 @@ from typing import Dict, Any, Optional
 from fastapi import Depends, HTTPException, status, Header
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError
-from app.db.database import sql
+from app.db.database import sql_async, replicas, set_session_key, use_primary
 from app.core.security import decode_access_token, get_api_key_hash
 
 
@@ -16,7 +16,7 @@ oauth2_scheme = HTTPBearer(auto_error=False)
 # api_key_header = APIKeyHeader(name="X-API-Key")
 
 
-def get_current_user_any_method(
+async def get_current_user_any_method(
     x_api_key: Optional[str] = Header(None, alias="X-API-Key"),
     token: Optional[HTTPAuthorizationCredentials] = Depends(oauth2_scheme)
 ) -> Dict[str, Any]:
@@ -28,9 +28,15 @@ def get_current_user_any_method(
     )
 
     if x_api_key:
-        user = get_current_user_by_api_key(x_api_key)
+        user = await get_current_user_by_api_key(x_api_key)
+
+        if not user and replicas:
+            # The key may have been issued moments ago and not replicated yet
+            with use_primary():
+                user = await get_current_user_by_api_key(x_api_key)
 
         if user:
+            set_session_key(user['id'])
             return {
                 "id": user['id'],
                 "email": user['email'],
@@ -47,9 +53,14 @@ def get_current_user_any_method(
     if token:
         try:
 
-            user = get_current_user_by_token(token, credentials_exception)
+            user = await get_current_user_by_token(token, credentials_exception)
+
+            if not user and replicas:
+                with use_primary():
+                    user = await get_current_user_by_token(token, credentials_exception)
 
             if user:
+                set_session_key(user['id'])
                 return {
                     "id": user['id'],
                     "email": user['email'],
@@ -65,19 +76,19 @@ def get_current_user_any_method(
     raise credentials_exception
 
 
-def get_current_user_by_api_key(api_key):
+async def get_current_user_by_api_key(api_key):
     hashed_key = get_api_key_hash(api_key)
-    return sql("""
+    return (await sql_async("""
             SELECT * FROM users
             WHERE api_key_hash = :hashed_key
             AND api_key_expires_at > NOW()
             AND is_active = TRUE
             """,
-               hashed_key=hashed_key
-               ).dict()
+                            hashed_key=hashed_key
+                            )).dict()
 
 
-def get_current_user_by_token(token, credentials_exception):
+async def get_current_user_by_token(token, credentials_exception):
     try:
         payload = decode_access_token(token.credentials)
         user_id = payload.get("sub")
@@ -90,12 +101,12 @@ def get_current_user_by_token(token, credentials_exception):
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    return sql("SELECT * FROM users WHERE id = :user_id AND is_active = TRUE",
-               user_id=user_id
-               ).dict()
+    return (await sql_async("SELECT * FROM users WHERE id = :user_id AND is_active = TRUE",
+                            user_id=user_id
+                            )).dict()
 
 
-def get_current_active_user(
+async def get_current_active_user(
     current_user: Dict[str, Any] = Depends(get_current_user_any_method)
 ) -> Dict[str, Any]:
 
@@ -104,7 +115,7 @@ def get_current_active_user(
     return current_user
 
 
-def check_admin_access(current_user: Dict[str, Any] = Depends(get_current_active_user)) -> Dict[str, Any]:
+async def check_admin_access(current_user: Dict[str, Any] = Depends(get_current_active_user)) -> Dict[str, Any]:
     if current_user["role_id"] != 1:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -113,7 +124,7 @@ def check_admin_access(current_user: Dict[str, Any] = Depends(get_current_active
     return current_user
 
 
-def check_librarian_access(current_user: Dict[str, Any] = Depends(get_current_active_user)) -> Dict[str, Any]:
+async def check_librarian_access(current_user: Dict[str, Any] = Depends(get_current_active_user)) -> Dict[str, Any]:
     if current_user["role_id"] not in [1, 2]:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -0,0 +1,64 @@
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from app.api.deps import check_admin_access
+from app.schemas.admin import (
+    CacheStats, DatabasePools, ReplicaStatus, SlowQuery, ExportTable, ExportFormat
+)
+from app.services import admin as admin_service
+from app.services import export as export_service
+
+router = APIRouter()
+
+
+@router.get("/db/pool", response_model=DatabasePools)
+def get_db_pool_status(
+    _: Dict[str, Any] = Depends(check_admin_access)
+):
+    return admin_service.get_db_pool_status()
+
+
+@router.get("/db/replicas", response_model=List[ReplicaStatus])
+def get_db_replica_status(
+    _: Dict[str, Any] = Depends(check_admin_access)
+):
+    return admin_service.get_db_replica_status()
+
+
+@router.get("/db/slow-queries", response_model=List[SlowQuery])
+def get_db_slow_queries(
+    _: Dict[str, Any] = Depends(check_admin_access)
+):
+    return admin_service.get_db_slow_queries()
+
+
+@router.get("/cache", response_model=CacheStats)
+def get_cache_stats(
+    _: Dict[str, Any] = Depends(check_admin_access)
+):
+    return admin_service.get_cache_stats()
+
+
+@router.get("/export/{table}", response_class=StreamingResponse)
+def export_table(
+    table: ExportTable,
+    format: ExportFormat = ExportFormat.NDJSON,
+    since: Optional[datetime] = None,
+    since_id: Optional[int] = None,
+    gzip: bool = False,
+    _: Dict[str, Any] = Depends(check_admin_access)
+):
+    headers = {
+        "Content-Disposition":
+            f'attachment; filename="{table.value}.{format.value}"'
+    }
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+
+    return StreamingResponse(
+        export_service.export_table(table.value, format.value, since,
+                                   since_id, gzip),
+        media_type=export_service.MEDIA_TYPES[format.value],
+        headers=headers,
+    )
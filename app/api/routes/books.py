@@ -1,11 +1,14 @@
-from typing import Dict, Any
-from fastapi import APIRouter, Depends
+from typing import Dict, Any, Optional
+from fastapi import APIRouter, Depends, File, UploadFile
 from app.api.deps import check_librarian_access, get_current_active_user
 from app.schemas.book import (
     BookCreate, BookUpdate, Book, CategoryCreate,
-    PaginatedCategoryResponse, Category, BookSearchParams, PaginatedBookResponse, BookItemCreate, BookItem
+    PaginatedCategoryResponse, Category, BookSearchParams, PaginatedBookResponse, BookItemCreate, BookItem,
+    BookSuggestions, BookImportResult, BookBatchResponse
 )
 from app.services import books as book_service
+from app.services import book_import as book_import_service
+from app.services import suggest as suggest_service
 
 router = APIRouter()
 
@@ -35,6 +38,16 @@ def create_book(
     return book_service.create_book(book)
 
 
+@router.post("/import", response_model=BookImportResult)
+def import_books(
+    file: UploadFile = File(...),
+    format: Optional[str] = None,
+    _: Dict[str, Any] = Depends(check_librarian_access)
+):
+    file_format = book_import_service.file_format(file.filename, format)
+    return book_import_service.import_books(file.file, file_format)
+
+
 @router.post("/copy", response_model=Book)
 def add_book_copy(
     book_copy: BookItemCreate,
@@ -44,19 +57,36 @@ def add_book_copy(
 
 
 @router.get("", response_model=PaginatedBookResponse)
-def search_books(
+async def search_books(
     params: BookSearchParams = Depends(),
     _: Dict[str, Any] = Depends(get_current_active_user)
 ):
-    return book_service.search_books(params)
+    return await book_service.search_books_async(params)
+
+
+@router.get("/suggest", response_model=BookSuggestions)
+async def suggest_books(
+    q: str,
+    limit: int = 10,
+    _: Dict[str, Any] = Depends(get_current_active_user)
+):
+    return suggest_service.suggest_books(q, limit)
+
+
+@router.get("/batch", response_model=BookBatchResponse)
+async def get_books_batch(
+    ids: str,
+    _: Dict[str, Any] = Depends(get_current_active_user)
+):
+    return await book_service.get_books_batch_async(ids)
 
 
 @router.get("/{book_id}", response_model=Book)
-def get_book(
+async def get_book(
     book_id: int,
     _: Dict[str, Any] = Depends(get_current_active_user)
 ):
-    return book_service.get_book(book_id)
+    return await book_service.get_book_async(book_id)
 
 
 @router.put("/{book_id}", response_model=Book)
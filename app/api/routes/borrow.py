@@ -8,27 +8,27 @@ router = APIRouter()
 
 
 @router.post("", response_model=Borrow)
-def borrow_book(
+async def borrow_book(
     borrow_data: BorrowRequest,
     current_user: Dict[str, Any] = Depends(get_current_active_user)
 ):
-    return borrow_service.borrow_book(borrow_data, current_user)
+    return await borrow_service.borrow_book_async(borrow_data, current_user)
 
 
 @router.post("/return", response_model=Borrow)
-def return_book(
+async def return_book(
     return_data: ReturnRequest,
     current_user: Dict[str, Any] = Depends(get_current_active_user)
 ):
-    return borrow_service.return_book(current_user, return_data)
+    return await borrow_service.return_book_async(current_user, return_data)
 
 
 @router.get("/history", response_model=PaginatedBorrowResponse)
-def get_borrow_history(
+async def get_borrow_history(
     params: BorrowHistoryParams = Depends(),
     current_user: Dict[str, Any] = Depends(get_current_active_user)
 ):
-    return borrow_service.get_borrow_history(current_user, params)
+    return await borrow_service.get_borrow_history_async(current_user, params)
 
 
 @router.post("/notify", response_model=Dict[str, str])
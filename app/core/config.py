@@ -11,7 +11,65 @@ class Settings(BaseSettings):
     DB_HOST: str = os.getenv("DB_HOST", "localhost")
     DB_PORT: str = os.getenv("DB_PORT", "3306")
     DB_NAME: str = os.getenv("DB_NAME", "library_db")
-    DATABASE_URL: str = f"mysql+mysqlconnector://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    # PyMySQL supports server-side cursors (sql_stream); mysql-connector does
+    # not. sqlite:///library.db or sqlite:// (in-memory) run without MySQL.
+    DATABASE_URL: str = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+    # Connection pool (sync route handlers share a threadpool of ~40 threads)
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "20"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT: int = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+    # Keep below MySQL's wait_timeout so idle connections are never stale
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING: bool = os.getenv(
+        "DB_POOL_PRE_PING", "true").lower() == "true"
+
+    # Async engine used by the async route handlers (sql_async); defaults to
+    # DATABASE_URL with its asyncio driver (aiomysql / aiosqlite)
+    ASYNC_DATABASE_URL: str = os.getenv("ASYNC_DATABASE_URL", "")
+    DB_ASYNC_POOL_SIZE: int = int(os.getenv("DB_ASYNC_POOL_SIZE", "50"))
+    DB_ASYNC_MAX_OVERFLOW: int = int(
+        os.getenv("DB_ASYNC_MAX_OVERFLOW", "50"))
+
+    # Read replicas (comma-separated URLs) for SELECT-only sql() calls
+    DATABASE_REPLICA_URLS: str = os.getenv("DATABASE_REPLICA_URLS", "")
+    DB_REPLICA_MAX_LAG_SECONDS: float = float(
+        os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "5"))
+    DB_REPLICA_CHECK_INTERVAL: float = float(
+        os.getenv("DB_REPLICA_CHECK_INTERVAL", "10"))
+    # After a write, keep reading from the primary for this long
+    DB_READ_YOUR_WRITES_SECONDS: float = float(
+        os.getenv("DB_READ_YOUR_WRITES_SECONDS", "5"))
+
+    # Per-request query log: warn above this many queries per request, or when
+    # one statement shape repeats more than this many times (N+1)
+    QUERY_COUNT_WARN_THRESHOLD: int = int(
+        os.getenv("QUERY_COUNT_WARN_THRESHOLD", "20"))
+    QUERY_REPEAT_WARN_THRESHOLD: int = int(
+        os.getenv("QUERY_REPEAT_WARN_THRESHOLD", "5"))
+
+    # Slow query log: statements slower than the threshold are logged and get
+    # an EXPLAIN captured at most once per interval per statement shape
+    SLOW_QUERY_THRESHOLD_MS: float = float(
+        os.getenv("SLOW_QUERY_THRESHOLD_MS", "200"))
+    SLOW_QUERY_EXPLAIN_INTERVAL: float = float(
+        os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL", "300"))
+    SLOW_QUERY_MAX_ENTRIES: int = int(
+        os.getenv("SLOW_QUERY_MAX_ENTRIES", "200"))
+
+    # Parameter sets sent per executemany() call by sql_many()
+    SQL_BATCH_SIZE: int = int(os.getenv("SQL_BATCH_SIZE", "1000"))
+
+    # Rows fetched per round-trip when streaming with sql_stream()
+    SQL_STREAM_BATCH_SIZE: int = int(
+        os.getenv("SQL_STREAM_BATCH_SIZE", "1000"))
+
+    # Exports stop at rows updated this many seconds ago, so that rows of
+    # transactions still in flight cannot commit behind the export cursor
+    EXPORT_SETTLE_SECONDS: int = int(os.getenv("EXPORT_SETTLE_SECONDS", "5"))
+
+    # Rows validated and written per transaction by the bulk book import
+    IMPORT_CHUNK_SIZE: int = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
 
     API_SECRET_KEY: str = os.getenv("API_SECRET_KEY", "your-secret-key-here")
     API_KEY_EXPIRY_MINUTES: int = int(
@@ -26,6 +84,49 @@ class Settings(BaseSettings):
     RATE_LIMIT_PER_MINUTE: int = int(os.getenv("RATE_LIMIT_PER_MINUTE", "60"))
 
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    # Connections per Redis pool (sync and asyncio), and seconds to wait for
+    # a free connection, to connect and for a reply
+    REDIS_MAX_CONNECTIONS: int = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+    REDIS_POOL_TIMEOUT: float = float(os.getenv("REDIS_POOL_TIMEOUT", "1"))
+    REDIS_CONNECT_TIMEOUT: float = float(
+        os.getenv("REDIS_CONNECT_TIMEOUT", "0.25"))
+    REDIS_SOCKET_TIMEOUT: float = float(
+        os.getenv("REDIS_SOCKET_TIMEOUT", "0.25"))
+    # Consecutive Redis failures before the cache stops calling it, and
+    # seconds between probes while it does
+    REDIS_BREAKER_THRESHOLD: int = int(
+        os.getenv("REDIS_BREAKER_THRESHOLD", "5"))
+    REDIS_BREAKER_RESET: float = float(os.getenv("REDIS_BREAKER_RESET", "5"))
+    # Encoding of cached values: orjson, json or msgpack (json when the
+    # library isn't installed), and the size from which they are
+    # zlib-compressed (0: never)
+    CACHE_CODEC: str = os.getenv("CACHE_CODEC", "orjson")
+    CACHE_COMPRESS_MIN_BYTES: int = int(
+        os.getenv("CACHE_COMPRESS_MIN_BYTES", "4096"))
+    # In-process cache in front of Redis: entries per worker, and the
+    # longest an entry is served without going back to Redis
+    CACHE_L1_MAX_ENTRIES: int = int(os.getenv("CACHE_L1_MAX_ENTRIES", "10000"))
+    CACHE_L1_TTL: float = float(os.getenv("CACHE_L1_TTL", "30"))
+    # Cache fills: seconds an expired entry is still served while one
+    # request refreshes it, the Redis lock letting one worker fill a key,
+    # and how eagerly entries are refreshed before they expire (0: never)
+    CACHE_STALE_TTL: int = int(os.getenv("CACHE_STALE_TTL", "60"))
+    CACHE_FILL_LOCK_TIMEOUT: float = float(
+        os.getenv("CACHE_FILL_LOCK_TIMEOUT", "3"))
+    CACHE_EARLY_REFRESH_BETA: float = float(
+        os.getenv("CACHE_EARLY_REFRESH_BETA", "1"))
+    # Cached search_books pages (book ids per normalized search)
+    SEARCH_CACHE_TTL: int = int(os.getenv("SEARCH_CACHE_TTL", "300"))
+    # Category listings; invalidated by generation, the TTL only reclaims
+    # entries of old generations
+    CATEGORIES_CACHE_TTL: int = int(os.getenv("CATEGORIES_CACHE_TTL", "86400"))
+
+    # In-process title/author index of /books/suggest: seconds between
+    # picking up other workers' writes, and between full rebuilds
+    SUGGEST_REFRESH_INTERVAL: float = float(
+        os.getenv("SUGGEST_REFRESH_INTERVAL", "30"))
+    SUGGEST_REBUILD_INTERVAL: float = float(
+        os.getenv("SUGGEST_REBUILD_INTERVAL", "3600"))
 
     SSL_CERT_PATH: str = os.getenv("SSL_CERT_PATH", "./app/ssl/cert.pem")
     SSL_KEY_PATH: str = os.getenv("SSL_KEY_PATH", "./app/ssl/key.pem")
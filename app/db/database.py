@@ -1,20 +1,371 @@
 import logging
-from sqlalchemy import create_engine, text
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from contextlib import contextmanager, asynccontextmanager
+from contextvars import ContextVar
+from sqlalchemy import bindparam, create_engine, text
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
 from app.core.config import settings
+from app.db import dialects
+from app.db.instrumentation import (
+    record_query, record_slow_query, slow_queries, statement_shape
+)
+from app.db.pool import InstrumentedQueuePool, InstrumentedAsyncQueuePool
+from app.db.replicas import Replica, ReplicaSet, async_url
+from app.db.rows import record_type
 from sqlalchemy.ext.declarative import declarative_base
 
 
 logger = logging.getLogger(__name__)
 
-engine = create_engine(settings.DATABASE_URL)
+
+def _create_engine(url):
+    url = dialects.sqlite_url(url, settings.DB_NAME)
+    engine = create_engine(
+        url,
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        **dialects.engine_options(url),
+    )
+    dialects.install(engine)
+    return engine
+
+
+def _create_async_engine(url):
+    url = dialects.sqlite_url(url, settings.DB_NAME)
+    engine = create_async_engine(
+        url,
+        poolclass=InstrumentedAsyncQueuePool,
+        pool_size=settings.DB_ASYNC_POOL_SIZE,
+        max_overflow=settings.DB_ASYNC_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        **dialects.engine_options(url),
+    )
+    dialects.install(engine.sync_engine)
+    return engine
+
+
+engine = _create_engine(settings.DATABASE_URL)
+
+async_engine = _create_async_engine(
+    settings.ASYNC_DATABASE_URL or async_url(settings.DATABASE_URL))
+
+replicas = ReplicaSet(
+    [
+        Replica(url, _create_engine(url), _create_async_engine(async_url(url)))
+        for url in (u.strip() for u in settings.DATABASE_REPLICA_URLS.split(","))
+        if url
+    ],
+    max_lag=settings.DB_REPLICA_MAX_LAG_SECONDS,
+    check_interval=settings.DB_REPLICA_CHECK_INTERVAL,
+)
 
 Base = declarative_base()
 
+# Connection of the unit of work active in the current context, if any
+_current_connection = ContextVar("db_connection", default=None)
+_current_async_connection = ContextVar("db_async_connection", default=None)
+
+# Read routing state: use_primary() blocks, the session that is reading and
+# the time of the last write made from the current context
+_force_primary = ContextVar("db_force_primary", default=False)
+_session_key = ContextVar("db_session_key", default=None)
+_last_write = ContextVar("db_last_write", default=None)
+
+# Last write per session key, so stickiness outlives a single request
+# (per worker process)
+_last_write_by_session = {}
+_MAX_TRACKED_SESSIONS = 10000
+
+# Errors after which a replica read is retried on the primary
+_REPLICA_ERRORS = (OperationalError, PoolTimeoutError)
+
+
+def _is_read(query):
+    head = query.lstrip()[:6].upper()
+    return head == "SELECT" and "FOR UPDATE" not in query.upper()
+
+
+def _record_write():
+    now = time.monotonic()
+    _last_write.set(now)
+
+    key = _session_key.get()
+    if key is None:
+        return
+
+    _last_write_by_session[key] = now
+    if len(_last_write_by_session) > _MAX_TRACKED_SESSIONS:
+        window = settings.DB_READ_YOUR_WRITES_SECONDS
+        for stale in [k for k, ts in list(_last_write_by_session.items())
+                      if now - ts > window]:
+            _last_write_by_session.pop(stale, None)
+
+
+def _read_replica():
+    if not replicas or _force_primary.get():
+        return None
+
+    last_write = _last_write.get()
+    key = _session_key.get()
+    if key is not None and key in _last_write_by_session:
+        last_write = max(last_write or 0, _last_write_by_session[key])
+
+    if last_write is not None and \
+            time.monotonic() - last_write < settings.DB_READ_YOUR_WRITES_SECONDS:
+        return None
+
+    return replicas.pick()
+
+
+def set_session_key(key):
+    """
+    Scope read-your-writes stickiness to a session, e.g. the current user id.
+    """
+    _session_key.set(key)
+
+
+@contextmanager
+def use_primary():
+    """
+    Route every read in the block to the primary.
+    """
+    token = _force_primary.set(True)
+    try:
+        yield
+    finally:
+        _force_primary.reset(token)
+
+
+def dialect_name():
+    return engine.dialect.name
+
+
+def get_pool_status():
+    return {
+        "sync": engine.pool.status_dict(),
+        "async": async_engine.pool.status_dict(),
+    }
+
+
+def get_replica_status():
+    return replicas.status()
+
+
+def get_slow_queries():
+    return slow_queries.snapshot()
+
+
+@contextmanager
+def transaction():
+    """
+    Unit of work: bind one connection and transaction to the current context.
+
+    Every sql() call made inside the block joins this transaction, which
+    commits once when the block exits and rolls back if it raises. Nested
+    blocks join the outermost transaction.
+    """
+    conn = _current_connection.get()
+    if conn is not None:
+        yield conn
+        return
+
+    with engine.begin() as conn:
+        token = _current_connection.set(conn)
+        try:
+            yield conn
+        finally:
+            _current_connection.reset(token)
+
+
+def _text(query, para):
+    statement = text(query)
+    if isinstance(para, dict):
+        # List values expand into IN (...) lists: "WHERE id IN :ids"
+        expanding = [bindparam(name, expanding=True)
+                     for name, value in para.items()
+                     if isinstance(value, (list, tuple))]
+        if expanding:
+            statement = statement.bindparams(*expanding)
+    return statement
+
+
+# EXPLAINs of slow statements run off the request path, one at a time
+_explain_executor = ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix="slow-query-explain")
+
+_EXPLAINABLE = ("SELECT", "UPDATE", "DELETE")
+
+
+def _explain(query, para):
+    prefix = dialects.explain_prefix(engine.dialect.name)
+    try:
+        with engine.connect() as conn:
+            plan = conn.execute(_text(prefix + query, para), para)
+            rows = [dict(row) for row in plan.mappings().all()]
+    except Exception as e:
+        logger.error(f"Could not EXPLAIN slow query: {e}")
+        return
+
+    slow_queries.store_explain(statement_shape(query), rows)
+    logger.warning(f"EXPLAIN {statement_shape(query)}: {rows}")
+
+
+def _record(query, para, duration):
+    record_query(query, duration)
+
+    if duration * 1000 < settings.SLOW_QUERY_THRESHOLD_MS:
+        return
+    if record_slow_query(query, para, duration) and isinstance(para, dict) \
+            and query.lstrip()[:6].upper() in _EXPLAINABLE:
+        _explain_executor.submit(_explain, query, dict(para))
+
+
+def _execute(conn, query, para, execution_options=None):
+    start = time.perf_counter()
+    result = conn.execute(_text(query, para), para,
+                          execution_options=execution_options)
+    _record(query, para, time.perf_counter() - start)
+    return result
+
+
+async def _execute_async(conn, query, para):
+    start = time.perf_counter()
+    result = await conn.execute(_text(query, para), para)
+    _record(query, para, time.perf_counter() - start)
+    return result
+
 
 def sql(query, **params):
     para = dict(**params)
+    is_read = _is_read(query)
+    if not is_read:
+        _record_write()
+
+    conn = _current_connection.get()
+    if conn is not None:
+        return SQLHelper(_execute(conn, query, para))
+
+    replica = _read_replica() if is_read else None
+    if replica is not None:
+        try:
+            with replica.engine.connect() as conn:
+                return SQLHelper(_execute(conn, query, para))
+        except _REPLICA_ERRORS as e:
+            replicas.mark_failed(replica, e)
+
     with engine.begin() as conn:
-        result = conn.execute(text(query), para)
+        result = _execute(conn, query, para)
+
+    return SQLHelper(result)
+
+
+def sql_many(query, rows, batch_size=settings.SQL_BATCH_SIZE):
+    """
+    Execute a write statement for many parameter sets with executemany().
+
+    Rows are sent batch_size at a time; the driver rewrites an
+    INSERT ... VALUES, also one ending in ON DUPLICATE KEY UPDATE, into
+    multi-row VALUES statements and runs anything else once per row. All
+    batches run in one transaction (or join the active one). Returns the
+    number of affected rows.
+    """
+    _record_write()
+
+    rows = iter(rows)
+    affected = 0
+    with transaction() as conn:
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            affected += _execute(conn, query, batch).rowcount
+
+    return affected
+
+
+@contextmanager
+def sql_stream(query, **params):
+    """
+    Run a query over a server-side cursor.
+
+    Rows are only fetched as the caller iterates SQLHelper.iter_rows() or
+    iter_dicts() inside the block, so memory stays bounded by the batch size.
+    The connection is held until the block exits; inside a transaction() the
+    stream must be fully consumed before the next sql() call.
+    """
+    para = dict(**params)
+    # Per statement: Connection.execution_options() would change the
+    # transaction's shared connection for every later sql() call
+    stream = {"stream_results": True}
+    conn = _current_connection.get()
+    if conn is not None:
+        result = _execute(conn, query, para, stream)
+        try:
+            yield SQLHelper(result)
+        finally:
+            result.close()
+        return
+
+    replica = _read_replica() if _is_read(query) else None
+    bind = replica.engine if replica is not None else engine
+
+    with bind.connect() as conn:
+        result = _execute(conn, query, para, stream)
+        try:
+            yield SQLHelper(result)
+        finally:
+            result.close()
+
+
+@asynccontextmanager
+async def async_transaction():
+    """
+    Async counterpart of transaction(), joined by sql_async() calls.
+    """
+    conn = _current_async_connection.get()
+    if conn is not None:
+        yield conn
+        return
+
+    async with async_engine.begin() as conn:
+        token = _current_async_connection.set(conn)
+        try:
+            yield conn
+        finally:
+            _current_async_connection.reset(token)
+
+
+async def sql_async(query, **params):
+    para = dict(**params)
+    is_read = _is_read(query)
+    if not is_read:
+        _record_write()
+
+    conn = _current_async_connection.get()
+    if conn is not None:
+        return SQLHelper(await _execute_async(conn, query, para))
+
+    replica = _read_replica() if is_read else None
+    if replica is not None:
+        try:
+            async with replica.async_engine.connect() as conn:
+                return SQLHelper(await _execute_async(conn, query, para))
+        except _REPLICA_ERRORS as e:
+            replicas.mark_failed(replica, e)
+
+    # Results of AsyncConnection.execute() are buffered, so the sync
+    # SQLHelper accessors work on them after the connection is released
+    async with async_engine.begin() as conn:
+        result = await _execute_async(conn, query, para)
 
     return SQLHelper(result)
 
@@ -24,22 +375,49 @@ class SQLHelper:
         self.exec_res = exec_res
 
     def dict(self):
-        res = [dict(row) for row in self.exec_res.mappings().all()]
-        if not res:
+        # first() fetches a single row and discards the rest of the result
+        row = self.exec_res.mappings().first()
+        if not row:
             return {}
-        return res[0]
+        return dict(row)
 
     def dicts(self):
         return [dict(row) for row in self.exec_res.mappings().all()]
 
-    def scalar(self):
-        d = self.dict()
-        if not d:
+    def tuples(self):
+        return [tuple(row) for row in self.exec_res.all()]
+
+    def record(self):
+        cls = record_type(self.exec_res.keys())
+        row = self.exec_res.first()
+        if not row:
             return None
-        return list(d.values())[0]
+        return cls(*row)
+
+    def records(self):
+        cls = record_type(self.exec_res.keys())
+        return [cls(*row) for row in self.exec_res.all()]
+
+    def scalar(self):
+        return self.exec_res.scalar()
 
     def scalars(self):
-        d = self.dicts()
-        if not d:
-            return []
-        return [list(r.values())[0] for r in d]
+        return self.exec_res.scalars().all()
+
+    def iter_rows(self, batch_size=settings.SQL_STREAM_BATCH_SIZE):
+        for rows in self.exec_res.partitions(batch_size):
+            yield from rows
+
+    def iter_batches(self, batch_size=settings.SQL_STREAM_BATCH_SIZE):
+        yield from self.exec_res.partitions(batch_size)
+
+    def iter_dicts(self, batch_size=settings.SQL_STREAM_BATCH_SIZE):
+        for rows in self.exec_res.mappings().partitions(batch_size):
+            for row in rows:
+                yield dict(row)
+
+    def lastrowid(self):
+        return self.exec_res.lastrowid
+
+    def rowcount(self):
+        return self.exec_res.rowcount
@@ -0,0 +1,230 @@
+"""
+SQLite support, so the API and the benchmarks run without a MySQL server.
+
+The models and services are written for MySQL; this module bridges the few
+MySQL-only pieces they use:
+
+- NOW() is registered as a SQL function on every SQLite connection
+- "ON UPDATE CURRENT_TIMESTAMP" is dropped from column DDL and replaced by an
+  AFTER UPDATE trigger on every table with an updated_at column
+- TIMESTAMP/DATETIME columns come back as datetime objects, like on MySQL
+- in-memory URLs get a shared-cache name, so every pooled connection (sync
+  and async) sees the same database
+- FULLTEXT indexes become FTS5 tables kept in sync by triggers
+"""
+import re
+import sqlite3
+from datetime import datetime
+from sqlalchemy import DDL, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.schema import CreateColumn
+
+
+_MEMORY_DATABASES = (None, "", ":memory:")
+
+# Keeps each shared in-memory database alive while pooled connections churn
+_memory_keepalive = {}
+
+
+def is_sqlite(url) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def _now():
+    # CURRENT_TIMESTAMP format; like the app, assumes the server runs in UTC
+    return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _convert_datetime(value: bytes) -> datetime:
+    return datetime.fromisoformat(value.decode())
+
+
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_converter("TIMESTAMP", _convert_datetime)
+sqlite3.register_converter("DATETIME", _convert_datetime)
+
+
+def sqlite_url(url: str, name: str) -> str:
+    """
+    Give an in-memory SQLite URL a shared-cache database name.
+
+    A plain "sqlite://" is private to each connection, so every pooled
+    connection would see its own empty database.
+    """
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite" or \
+            parsed.database not in _MEMORY_DATABASES:
+        return url
+
+    database = f"file:{name}"
+    if database not in _memory_keepalive:
+        _memory_keepalive[database] = sqlite3.connect(
+            f"{database}?mode=memory&cache=shared", uri=True,
+            check_same_thread=False)
+
+    return str(parsed.set(database=database, query={
+        "mode": "memory", "cache": "shared", "uri": "true"}))
+
+
+def engine_options(url) -> dict:
+    """Extra create_engine() arguments for the URL's backend."""
+    if not is_sqlite(url):
+        return {}
+    return {
+        # Converters above turn TIMESTAMP/DATETIME columns into datetimes
+        "connect_args": {
+            "detect_types": sqlite3.PARSE_DECLTYPES,
+            "check_same_thread": False,
+        },
+        "native_datetime": True,
+    }
+
+
+def _on_sqlite_connect(dbapi_connection, connection_record):
+    dbapi_connection.create_function("NOW", 0, _now)
+    cursor = dbapi_connection.cursor()
+    # WAL lets readers run alongside the writer on file databases
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.close()
+
+
+def install(engine) -> None:
+    """Register the SQLite connection hooks on a sync engine."""
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _on_sqlite_connect)
+
+
+@compiles(CreateColumn, "sqlite")
+def _sqlite_create_column(element, compiler, **kw):
+    ddl = compiler.visit_create_column(element, **kw)
+    return ddl.replace(" ON UPDATE CURRENT_TIMESTAMP", "")
+
+
+def add_updated_at_triggers(metadata) -> None:
+    """
+    Emulate MySQL's ON UPDATE CURRENT_TIMESTAMP on SQLite with triggers.
+
+    The trigger only fires when the UPDATE did not set updated_at itself.
+    """
+    for table in metadata.tables.values():
+        if "updated_at" not in table.c:
+            continue
+        trigger = DDL(
+            f"CREATE TRIGGER trg_{table.name}_updated_at "
+            f"AFTER UPDATE ON {table.name} FOR EACH ROW "
+            f"WHEN NEW.updated_at IS OLD.updated_at BEGIN "
+            f"UPDATE {table.name} SET updated_at = CURRENT_TIMESTAMP "
+            f"WHERE rowid = NEW.rowid; END"
+        )
+        event.listen(table, "after_create", trigger.execute_if(dialect="sqlite"))
+
+
+def add_fulltext_index(table, columns) -> None:
+    """
+    Emulate a MySQL FULLTEXT index on SQLite with an FTS5 table.
+
+    The FTS table stores no copy of the rows (content=table) and is kept in
+    sync by triggers; the porter tokenizer stems terms ("borrowing" matches
+    "borrow"). It is dropped with the table.
+    """
+    name = f"{table.name}_fts"
+    listed = ", ".join(columns)
+    new_values = ", ".join(f"new.{column}" for column in columns)
+    old_values = ", ".join(f"old.{column}" for column in columns)
+
+    statements = [
+        f"CREATE VIRTUAL TABLE {name} USING fts5({listed}, "
+        f"content='{table.name}', content_rowid='id', "
+        f"tokenize='porter unicode61')",
+        f"CREATE TRIGGER {name}_insert AFTER INSERT ON {table.name} BEGIN "
+        f"INSERT INTO {name} (rowid, {listed}) VALUES (new.id, {new_values}); "
+        f"END",
+        f"CREATE TRIGGER {name}_delete AFTER DELETE ON {table.name} BEGIN "
+        f"INSERT INTO {name} ({name}, rowid, {listed}) "
+        f"VALUES ('delete', old.id, {old_values}); END",
+        f"CREATE TRIGGER {name}_update AFTER UPDATE OF {listed} "
+        f"ON {table.name} BEGIN "
+        f"INSERT INTO {name} ({name}, rowid, {listed}) "
+        f"VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {name} (rowid, {listed}) VALUES (new.id, {new_values}); "
+        f"END",
+    ]
+    for statement in statements:
+        event.listen(table, "after_create",
+                     DDL(statement).execute_if(dialect="sqlite"))
+    event.listen(table, "before_drop",
+                 DDL(f"DROP TABLE IF EXISTS {name}").execute_if(dialect="sqlite"))
+
+
+_WORD = re.compile(r"\w+")
+
+
+def fulltext_search(dialect_name: str, table: str, alias: str, columns, q: str):
+    """
+    Pieces of a relevance-ranked full-text search over `columns`.
+
+    Returns (join, condition, relevance, terms): a clause to append after
+    "FROM table alias", a WHERE condition, an expression to ORDER BY
+    (higher is more relevant) and the value to bind as :q. Both backends
+    match any of the words, ranking rows that match more (and rarer) words
+    first: MySQL's natural language mode and SQLite's BM25.
+    """
+    if dialect_name == "sqlite":
+        fts = f"{table}_fts"
+        # Quoted words, so FTS5 query syntax in user input is taken literally
+        terms = " OR ".join(f'"{word}"' for word in _WORD.findall(q))
+        return (f" JOIN {fts} ON {fts}.rowid = {alias}.id",
+                f"{fts} MATCH :q",
+                f"-bm25({fts})",
+                terms or '""')
+
+    match = (f"MATCH({', '.join(f'{alias}.{column}' for column in columns)}) "
+             f"AGAINST (:q IN NATURAL LANGUAGE MODE)")
+    return "", match, match, q
+
+
+def upsert_clause(dialect_name: str, keys, columns, increment: bool = False,
+                  coalesce=()) -> str:
+    """
+    Tail of an INSERT that updates `columns` of the row with the same `keys`
+    instead of failing: ON DUPLICATE KEY UPDATE on MySQL, ON CONFLICT on
+    SQLite. With increment=True the inserted values are added to the
+    existing ones. The `coalesce` columns take the inserted value unless it
+    is NULL.
+    """
+    if dialect_name == "sqlite":
+        new, clause = "excluded.{}", f" ON CONFLICT ({', '.join(keys)}) DO UPDATE SET "
+    else:
+        new, clause = "VALUES({})", " ON DUPLICATE KEY UPDATE "
+
+    return clause + ", ".join(
+        [f"{column} = {column} + {new.format(column)}" if increment
+         else f"{column} = {new.format(column)}"
+         for column in columns] +
+        [f"{column} = COALESCE({new.format(column)}, {column})"
+         for column in coalesce]
+    )
+
+
+def lock_rows_clause(dialect_name: str) -> str:
+    """
+    Tail of a SELECT that locks the rows it returns and skips rows other
+    transactions have locked. SQLite has no row locks: the first write of a
+    transaction locks the whole database, so it needs none.
+    """
+    return "" if dialect_name == "sqlite" else " FOR UPDATE SKIP LOCKED"
+
+
+def seconds_ago(dialect_name: str, param: str) -> str:
+    """
+    Expression for the database time :param seconds ago. SQLite's NOW() (see
+    _now) returns text in the format datetime() reads and writes.
+    """
+    if dialect_name == "sqlite":
+        return f"datetime(NOW(), '-' || :{param} || ' seconds')"
+    return f"NOW() - INTERVAL :{param} SECOND"
+
+
+def explain_prefix(dialect_name: str) -> str:
+    return "EXPLAIN QUERY PLAN " if dialect_name == "sqlite" else "EXPLAIN "
@@ -0,0 +1,201 @@
+import logging
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from functools import lru_cache
+from app.core.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+# Query log of the request being handled in the current context, if any
+_request_log = ContextVar("db_query_log", default=None)
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_BIND_PARAM = re.compile(r"(?<!:):\w+")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+
+
+@lru_cache(maxsize=2048)
+def statement_shape(query: str) -> str:
+    """
+    Normalize a statement so calls that differ only in values compare equal.
+    """
+    shape = _WHITESPACE.sub(" ", query).strip()
+    shape = _STRING_LITERAL.sub("?", shape)
+    shape = _NUMBER_LITERAL.sub("?", shape)
+    shape = _BIND_PARAM.sub("?", shape)
+    return _IN_LIST.sub("(?)", shape)
+
+
+class QueryLog:
+    """
+    Statements issued while handling one request.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement = None
+        self.shapes = {}
+
+    def record(self, query: str, duration: float) -> None:
+        shape = statement_shape(query)
+        self.count += 1
+        self.total_time += duration
+        self.shapes[shape] = self.shapes.get(shape, 0) + 1
+        if duration > self.slowest_time:
+            self.slowest_time = duration
+            self.slowest_statement = shape
+
+    def repeated_shapes(self, threshold: int):
+        return {shape: count for shape, count in self.shapes.items()
+                if count > threshold}
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.total_time * 1000:.2f};desc="{self.count} queries"'
+
+    def report(self, method: str, path: str) -> None:
+        logger.debug(
+            f"{method} {path}: {self.count} queries in "
+            f"{self.total_time * 1000:.2f} ms, slowest "
+            f"{self.slowest_time * 1000:.2f} ms: {self.slowest_statement}")
+
+        if self.count > settings.QUERY_COUNT_WARN_THRESHOLD:
+            logger.warning(
+                f"{method} {path} issued {self.count} queries "
+                f"(threshold {settings.QUERY_COUNT_WARN_THRESHOLD})")
+
+        for shape, count in self.repeated_shapes(
+                settings.QUERY_REPEAT_WARN_THRESHOLD).items():
+            logger.warning(
+                f"{method} {path} repeated a statement {count} times, "
+                f"possible N+1: {shape}")
+
+
+def start_request_log():
+    log = QueryLog()
+    return log, _request_log.set(log)
+
+
+def end_request_log(token) -> None:
+    _request_log.reset(token)
+
+
+def record_query(query: str, duration: float) -> None:
+    log = _request_log.get()
+    if log is not None:
+        log.record(query, duration)
+
+
+def param_shape(params) -> dict:
+    """
+    Describe bound parameters by type (and length for IN lists), not value.
+    """
+    if not isinstance(params, dict):
+        return {"executemany": len(params)}
+
+    shape = {}
+    for name, value in params.items():
+        if isinstance(value, (list, tuple)):
+            shape[name] = f"list[{len(value)}]"
+        else:
+            shape[name] = type(value).__name__
+    return shape
+
+
+# Modules skipped when looking for the caller of a slow statement
+_INTERNAL_MODULES = ("app.db.database", "app.db.instrumentation",
+                     "contextlib", "sqlalchemy")
+
+
+def calling_function() -> str:
+    """
+    The first frame outside the database layer, e.g. the service function.
+    """
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if not module.startswith(_INTERNAL_MODULES):
+            return f"{module}.{frame.f_code.co_name}:{frame.f_lineno}"
+        frame = frame.f_back
+    return "unknown"
+
+
+class SlowQueryLog:
+    """
+    Slow statements grouped by shape, with the latest EXPLAIN of each.
+    """
+
+    def __init__(self, max_entries: int, explain_interval: float):
+        self.max_entries = max_entries
+        self.explain_interval = explain_interval
+        self.entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, shape: str, duration: float, params, caller: str) -> bool:
+        """Record one slow execution; returns True when an EXPLAIN is due."""
+        now = time.time()
+        with self._lock:
+            entry = self.entries.pop(shape, None)
+            if entry is None:
+                entry = {
+                    "statement": shape,
+                    "count": 0,
+                    "max_ms": 0.0,
+                    "explain": None,
+                    "explained_at": None,
+                }
+                while len(self.entries) >= self.max_entries:
+                    self.entries.popitem(last=False)
+
+            entry["count"] += 1
+            entry["last_ms"] = duration * 1000
+            entry["max_ms"] = max(entry["max_ms"], duration * 1000)
+            entry["last_seen"] = now
+            entry["params"] = param_shape(params)
+            entry["caller"] = caller
+            self.entries[shape] = entry
+
+            explain_due = entry["explained_at"] is None or \
+                now - entry["explained_at"] >= self.explain_interval
+            if explain_due:
+                # Claim the slot now so concurrent slow calls don't also explain
+                entry["explained_at"] = now
+            return explain_due
+
+    def store_explain(self, shape: str, plan) -> None:
+        with self._lock:
+            if shape in self.entries:
+                self.entries[shape]["explain"] = plan
+
+    def snapshot(self):
+        with self._lock:
+            return sorted((dict(entry) for entry in self.entries.values()),
+                          key=lambda entry: entry["max_ms"], reverse=True)
+
+
+slow_queries = SlowQueryLog(
+    max_entries=settings.SLOW_QUERY_MAX_ENTRIES,
+    explain_interval=settings.SLOW_QUERY_EXPLAIN_INTERVAL,
+)
+
+
+def record_slow_query(query: str, params, duration: float) -> bool:
+    """
+    Log a statement slower than SLOW_QUERY_THRESHOLD_MS.
+
+    Returns True when the caller should capture an EXPLAIN for it.
+    """
+    shape = statement_shape(query)
+    caller = calling_function()
+    logger.warning(
+        f"Slow query ({duration * 1000:.1f} ms) from {caller}: {shape} "
+        f"params={param_shape(params)}")
+    return slow_queries.record(shape, duration, params, caller)
@@ -0,0 +1,63 @@
+from app.core.config import settings
+from app.db.database import sql, sql_async
+
+
+class Loader:
+    """
+    Batched lookup of one relation, DataLoader style.
+
+    `query` selects the rows of a list of keys bound as :keys
+    ("... WHERE bc.book_id IN :keys") and returns each row's key in the
+    `key` column. The caller collects the keys of a whole page and
+    load_many() resolves them with one query (per SQL_BATCH_SIZE keys)
+    instead of one query per row.
+
+    With many=True a key maps to a list of rows (one-to-many; the key column
+    is dropped from them), otherwise to its row. Keys without rows map to []
+    or are left out. With records=True rows are SQLHelper.records() instead
+    of dicts, for rows read once to build a response (not with many=True).
+    """
+
+    def __init__(self, query: str, key: str = "id", many: bool = False,
+                 records: bool = False):
+        self.query = query
+        self.key = key
+        self.many = many
+        self.records = records
+
+    def _batches(self, keys):
+        keys = list(dict.fromkeys(key for key in keys if key is not None))
+        size = settings.SQL_BATCH_SIZE
+        return keys, [keys[i:i + size] for i in range(0, len(keys), size)]
+
+    def _group(self, keys, rows):
+        if not self.many:
+            return {row[self.key]: row for row in rows}
+
+        grouped = {key: [] for key in keys}
+        for row in rows:
+            grouped[row.pop(self.key)].append(row)
+        return grouped
+
+    def load_many(self, keys) -> dict:
+        keys, batches = self._batches(keys)
+        rows = []
+        for batch in batches:
+            result = sql(self.query, keys=batch)
+            rows.extend(result.records() if self.records else result.dicts())
+        return self._group(keys, rows)
+
+    async def load_many_async(self, keys) -> dict:
+        keys, batches = self._batches(keys)
+        rows = []
+        for batch in batches:
+            result = await sql_async(self.query, keys=batch)
+            rows.extend(result.records() if self.records else result.dicts())
+        return self._group(keys, rows)
+
+    def load(self, key):
+        return self.load_many([key]).get(key, [] if self.many else None)
+
+    async def load_async(self, key):
+        rows = await self.load_many_async([key])
+        return rows.get(key, [] if self.many else None)
@@ -1,8 +1,8 @@
-from sqlalchemy import Column, Integer, String, Boolean, Date, DateTime, Index, Enum
-from sqlalchemy.dialects.mysql import TEXT
+from sqlalchemy import Column, Integer, String, Boolean, Date, DateTime, Index, Enum, Text
 from sqlalchemy.schema import UniqueConstraint
 import sqlalchemy as sa
 from app.db.database import Base
+from app.db.dialects import add_fulltext_index, add_updated_at_triggers
 import enum
 
 
@@ -17,6 +17,11 @@ class BorrowedBookStatus(enum.Enum):
     OVERDUE = "overdue"
 
 
+def _enum_values(enum_class):
+    # Store the values the services write ('available'), not the member names
+    return [member.value for member in enum_class]
+
+
 class Role(Base):
     """
     Role model for user permissions.
@@ -72,6 +77,10 @@ class Category(Base):
         'CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP'), nullable=False)
 
 
+# Columns searched by the full-text search of search_books
+BOOK_TEXT_COLUMNS = ('title', 'author', 'publisher', 'description')
+
+
 class Book(Base):
     """
     Book model with detailed information.
@@ -83,7 +92,7 @@ class Book(Base):
     author = Column(String(50), nullable=False)
     publisher = Column(String(50), nullable=True)
     publication_year = Column(Integer, nullable=True, index=True)
-    description = Column(TEXT, nullable=True)
+    description = Column(Text, nullable=True)
     total_quantity = Column(Integer, nullable=False)
     available_quantity = Column(Integer, nullable=False)
 
@@ -95,7 +104,14 @@ class Book(Base):
     # Indexes / Constraints
     __table_args__ = (
         UniqueConstraint('title', 'author', name='unq_title_author'),
-        Index('idx_book_publication_year', 'publication_year')
+        Index('idx_book_publication_year', 'publication_year'),
+        # Keyset order of search_books
+        Index('idx_book_title', 'title', 'id'),
+        # Incremental exports (updated_at > since)
+        Index('idx_book_updated_at', 'updated_at'),
+        # Full-text search (q=); an FTS5 table on SQLite
+        Index('ft_book_text', *BOOK_TEXT_COLUMNS,
+              mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
     )
 
 
@@ -109,8 +125,9 @@ class BookItem(Base):
     book_id = Column(Integer, nullable=False)
     isbn = Column(String(50), unique=True, nullable=False)
     location = Column(String(50), nullable=True)
-    status = Column(Enum(BookStatus),
-                    default=BookStatus.AVAILABLE, nullable=False)
+    status = Column(Enum(BookStatus, values_callable=_enum_values),
+                    default=BookStatus.AVAILABLE,
+                    server_default=BookStatus.AVAILABLE.value, nullable=False)
     acquisition_date = Column(sa.TIMESTAMP, server_default=sa.text(
         'CURRENT_TIMESTAMP'), nullable=False)
 
@@ -122,6 +139,7 @@ class BookItem(Base):
     __table_args__ = (
         Index('idx_book_item_book_id', 'book_id'),
         Index('idx_book_item_status', 'status'),
+        Index('idx_book_item_updated_at', 'updated_at'),
     )
 
 
@@ -139,8 +157,9 @@ class BorrowRecord(Base):
     due_date = Column(DateTime, nullable=False)
     returned_date = Column(DateTime, nullable=True)
     # active, returned, overdue
-    status = Column(Enum(BorrowedBookStatus),
-                    default=BorrowedBookStatus.ACTIVE, nullable=False)
+    status = Column(Enum(BorrowedBookStatus, values_callable=_enum_values),
+                    default=BorrowedBookStatus.ACTIVE,
+                    server_default=BorrowedBookStatus.ACTIVE.value, nullable=False)
 
     created_at = Column(sa.TIMESTAMP, server_default=sa.text(
         'CURRENT_TIMESTAMP'), nullable=False)
@@ -151,6 +170,7 @@ class BorrowRecord(Base):
         Index('idx_borrow_user', 'user_id'),
         Index('idx_borrow_book', 'book_item_id'),
         Index('idx_borrow_status', 'status'),
+        Index('idx_borrow_updated_at', 'updated_at'),
     )
 
 
@@ -171,6 +191,19 @@ class BookCategory(Base):
     )
 
 
+class BookFacetCount(Base):
+    """
+    Precomputed number of books per facet value of the whole catalog:
+    facet 'category' (value: category id), 'year' (publication year) and
+    'available' (1: in stock, 0: out of stock).
+    """
+    __tablename__ = "book_facet_counts"
+
+    facet = Column(String(20), primary_key=True)
+    value = Column(Integer, primary_key=True, autoincrement=False)
+    book_count = Column(Integer, nullable=False, default=0)
+
+
 class NotificationQueue(Base):
     __tablename__ = "notification_queue"
 
@@ -187,3 +220,7 @@ class NotificationQueue(Base):
     __table_args__ = (
         UniqueConstraint('user_id', 'book_id', name='uq_user_book'),
     )
+
+
+add_updated_at_triggers(Base.metadata)
+add_fulltext_index(Book.__table__, BOOK_TEXT_COLUMNS)
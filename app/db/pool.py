@@ -0,0 +1,104 @@
+import threading
+import time
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+
+# Upper bounds (in milliseconds) of the checkout wait time histogram buckets
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+
+class PoolStats:
+    """
+    Thread-safe counters describing how callers wait for pooled connections.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.wait_histogram = [0] * (len(WAIT_BUCKETS_MS) + 1)
+
+    def record_checkout(self, wait_seconds: float) -> None:
+        wait_ms = wait_seconds * 1000
+        bucket = len(WAIT_BUCKETS_MS)
+        for i, upper in enumerate(WAIT_BUCKETS_MS):
+            if wait_ms <= upper:
+                bucket = i
+                break
+
+        with self._lock:
+            self.checkouts += 1
+            self.wait_time_total += wait_seconds
+            self.wait_time_max = max(self.wait_time_max, wait_seconds)
+            self.wait_histogram[bucket] += 1
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.checkout_failures += 1
+
+    def snapshot(self):
+        with self._lock:
+            histogram = {
+                f"le_{upper}ms": count
+                for upper, count in zip(WAIT_BUCKETS_MS, self.wait_histogram)
+            }
+            histogram["gt_{}ms".format(WAIT_BUCKETS_MS[-1])] = \
+                self.wait_histogram[-1]
+
+            return {
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "wait_time_avg_ms": (self.wait_time_total / self.checkouts * 1000
+                                     if self.checkouts else 0.0),
+                "wait_time_max_ms": self.wait_time_max * 1000,
+                "wait_time_histogram": histogram,
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool that records checkout wait times and failures.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            # Pool timeouts and failed connects both surface here
+            self.stats.record_failure()
+            raise
+
+        self.stats.record_checkout(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def status_dict(self):
+        return {
+            "size": self.size(),
+            "max_overflow": self._max_overflow,
+            "timeout": self.timeout(),
+            "checked_in": self.checkedin(),
+            "checked_out": self.checkedout(),
+            "overflow": max(self.overflow(), 0),
+            **self.stats.snapshot(),
+        }
+
+
+class InstrumentedAsyncQueuePool(InstrumentedQueuePool):
+    """
+    Asyncio flavour of InstrumentedQueuePool, used by the async engine.
+    """
+    _is_asyncio = AsyncAdaptedQueuePool._is_asyncio
+    _queue_class = AsyncAdaptedQueuePool._queue_class
+    _dialect = AsyncAdaptedQueuePool._dialect
@@ -0,0 +1,129 @@
+import itertools
+import logging
+import threading
+import time
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+
+
+logger = logging.getLogger(__name__)
+
+
+def async_url(url: str) -> str:
+    """Swap the driver of a sync database URL for its asyncio counterpart."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend == "mysql":
+        url = url.set(drivername="mysql+aiomysql")
+    elif backend == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+    # str(url) would mask the password
+    return url.render_as_string(hide_password=False)
+
+
+class Replica:
+    """
+    One read replica with its own sync and async connection pools.
+    """
+
+    def __init__(self, url: str, engine, async_engine):
+        self.url = make_url(url).render_as_string(hide_password=True)
+        self.engine = engine
+        self.async_engine = async_engine
+        self.healthy = True
+        self.lag_seconds = None
+        self.checked_at = None
+        self.error = None
+
+    def status_dict(self):
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "lag_seconds": self.lag_seconds,
+            "checked_at": self.checked_at,
+            "error": self.error,
+        }
+
+
+class ReplicaSet:
+    """
+    Round-robin selection over the healthy, sufficiently fresh replicas.
+
+    A daemon thread re-checks every replica every `check_interval` seconds, so
+    health and lag checks never run on the request path.
+    """
+
+    def __init__(self, replicas, max_lag: float, check_interval: float):
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._cycle = itertools.cycle(replicas)
+        self._lock = threading.Lock()
+
+        if replicas:
+            thread = threading.Thread(
+                target=self._check_loop, name="replica-health", daemon=True)
+            thread.start()
+
+    def __bool__(self):
+        return bool(self.replicas)
+
+    def pick(self):
+        with self._lock:
+            for _ in range(len(self.replicas)):
+                replica = next(self._cycle)
+                if replica.healthy:
+                    return replica
+        return None
+
+    def mark_failed(self, replica, error):
+        logger.warning(f"Replica {replica.url} failed, routing reads to the "
+                       f"primary until it recovers: {error}")
+        replica.healthy = False
+        replica.error = str(error)
+
+    def check(self, replica):
+        try:
+            lag = self._replication_lag(replica)
+        except Exception as e:
+            if replica.healthy:
+                self.mark_failed(replica, e)
+            replica.checked_at = time.time()
+            return
+
+        replica.lag_seconds = lag
+        replica.checked_at = time.time()
+        # A stopped replication thread reports NULL lag
+        replica.healthy = lag is not None and lag <= self.max_lag
+        replica.error = None if replica.healthy else \
+            f"replication lag {lag} exceeds {self.max_lag}s"
+
+    def _replication_lag(self, replica):
+        with replica.engine.connect() as conn:
+            if replica.engine.dialect.name != "mysql":
+                conn.execute(text("SELECT 1"))
+                return 0
+
+            try:
+                row = conn.execute(
+                    text("SHOW REPLICA STATUS")).mappings().first()
+                column = "Seconds_Behind_Source"
+            except Exception:
+                # MySQL < 8.0.22
+                row = conn.execute(
+                    text("SHOW SLAVE STATUS")).mappings().first()
+                column = "Seconds_Behind_Master"
+
+            # Not configured as a replica (e.g. a standalone read pool)
+            if row is None:
+                return 0
+            return row[column]
+
+    def _check_loop(self):
+        while True:
+            for replica in self.replicas:
+                self.check(replica)
+            time.sleep(self.check_interval)
+
+    def status(self):
+        return [replica.status_dict() for replica in self.replicas]
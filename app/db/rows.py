@@ -0,0 +1,87 @@
+import keyword
+
+
+# Record classes generated so far, keyed by their column names
+_record_types = {}
+
+
+class Record:
+    """
+    Base class of the compact row records returned by SQLHelper.records().
+
+    Subclasses are generated per column list with __slots__, so a record costs
+    one small object per row instead of a dict. Columns are readable as
+    attributes (for orm_mode schemas) or by key, like the dict rows.
+    """
+    __slots__ = ()
+    _fields = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return getattr(self, self._fields[key])
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def keys(self):
+        return self._fields
+
+    def _asdict(self):
+        return {name: getattr(self, name) for name in self._fields}
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __eq__(self, other):
+        if not isinstance(other, Record):
+            return NotImplemented
+        return self._asdict() == other._asdict()
+
+    def __repr__(self):
+        values = ", ".join(f"{name}={getattr(self, name)!r}"
+                           for name in self._fields)
+        return f"Record({values})"
+
+
+def _field_name(column, position, seen):
+    name = column if column.isidentifier() and not keyword.iskeyword(column) \
+        and not column.startswith("_") else f"col{position}"
+    while name in seen:
+        name = f"{name}_"
+    seen.add(name)
+    return name
+
+
+def record_type(columns):
+    """
+    Return the Record subclass for a column list, generating it on first use.
+    """
+    key = tuple(columns)
+    cls = _record_types.get(key)
+    if cls is not None:
+        return cls
+
+    seen = set()
+    fields = tuple(_field_name(column, i, seen)
+                   for i, column in enumerate(key))
+
+    # A generated positional __init__ is several times faster than setattr
+    args = ", ".join(fields)
+    body = "\n".join(f"    self.{name} = {name}" for name in fields) or "    pass"
+    namespace = {}
+    exec(f"def __init__(self, {args}):\n{body}", namespace)
+
+    cls = type("Record", (Record,), {
+        "__slots__": fields,
+        "_fields": fields,
+        "__init__": namespace["__init__"],
+    })
+    _record_types[key] = cls
+    return cls
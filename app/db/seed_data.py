@@ -1,7 +1,8 @@
 import logging
 from datetime import datetime
 from app.core.security import get_password_hash
-from app.db.database import sql
+from app.db.database import sql, sql_many, transaction
+from app.services.facets import rebuild_facet_counts
 
 logger = logging.getLogger(__name__)
 
@@ -15,12 +16,11 @@ def seed_roles() -> None:
             {"id": 3, "name": "user"}
         ]
 
-        for role in roles:
-            sql('''
-                INSERT INTO roles (id, name) VALUES (:id, :name)
-                ''',
-                **role
-                )
+        sql_many('''
+            INSERT INTO roles (id, name) VALUES (:id, :name)
+            ''',
+                 roles
+                 )
     except Exception as e:
         logger.error(f'error seeding roles {e}')
     logger.info("Roles seeded successfully")
@@ -98,21 +98,20 @@ def seed_sample_categories() -> None:
         {"name": "History"}
     ]
 
-    for category in categories:
-        # Check if category exists
-        cat_exists = sql("SELECT id FROM categories WHERE name = :name",
-                         name=category["name"]
-                         ).scalar()
-
-        if not cat_exists:
-            sql("""
-                    INSERT INTO categories 
-                    (name)
-                    VALUES 
-                    (:name)
-                """,
-                **category
-                )
+    # Check which categories exist
+    existing = set(sql("SELECT name FROM categories WHERE name IN :names",
+                       names=[category["name"] for category in categories]
+                       ).scalars())
+
+    sql_many("""
+            INSERT INTO categories 
+            (name)
+            VALUES 
+            (:name)
+        """,
+             [category for category in categories
+              if category["name"] not in existing]
+             )
 
     logger.info("Sample categories seeded successfully")
 
@@ -148,7 +147,7 @@ def seed_sample_books() -> None:
 
         if not book_exists:
 
-            result = sql("""
+            book_id = sql("""
                     INSERT INTO books 
                     (title, author, publisher, publication_year, description, 
                     total_quantity, available_quantity)
@@ -156,27 +155,20 @@ def seed_sample_books() -> None:
                     (:title, :author, :publisher, :publication_year, :description, 
                     :total_quantity, :available_quantity)
                 """,
-                         **book
-                         )
-
-            # Get the inserted book ID
-            book_id = sql("SELECT id FROM books WHERE title = :title AND author = :author",
-                          title=book["title"], author=book["author"]
-                          ).scalar()
+                          **book
+                          ).lastrowid()
 
             # Add book items
             isbn_base = book['title']
-            for i in range(book["total_quantity"]):
-                isbn = f"{isbn_base}-{i+1}"
-                sql("""
-                        INSERT INTO book_items 
-                        (book_id, isbn, status)
-                        VALUES 
-                        (:book_id, :isbn, 'available')
-                    """,
-                    book_id=book_id,
-                    isbn=isbn,
-                    )
+            sql_many("""
+                    INSERT INTO book_items 
+                    (book_id, isbn, status)
+                    VALUES 
+                    (:book_id, :isbn, 'available')
+                """,
+                     [{"book_id": book_id, "isbn": f"{isbn_base}-{i+1}"}
+                      for i in range(book["total_quantity"])]
+                     )
 
             # Assign categories
             if book["title"] == "Introduction to Library Science":
@@ -184,34 +176,85 @@ def seed_sample_books() -> None:
                     "SELECT id FROM categories WHERE name IN ('Non-Fiction', 'Education')"
                 ).scalars()
 
-                for cat_id in category_ids:
-                    sql("""
-                            INSERT INTO book_category 
-                            (book_id, category_id)
-                            VALUES 
-                            (:book_id, :category_id)
-                        """,
-                        book_id=book_id, category_id=cat_id
-                        )
-
             elif book["title"] == "Database Systems":
                 category_ids = sql(
                     "SELECT id FROM categories WHERE name IN ('Technology', 'Science')"
                 ).scalars()
 
-                for cat_id in category_ids:
-                    sql("""
-                            INSERT INTO book_category 
-                            (book_id, category_id)
-                            VALUES 
-                            (:book_id, :category_id)
-                        """,
-                        book_id=book_id, category_id=cat_id
-                        )
+            else:
+                category_ids = []
+
+            sql_many("""
+                    INSERT INTO book_category 
+                    (book_id, category_id)
+                    VALUES 
+                    (:book_id, :category_id)
+                """,
+                     [{"book_id": book_id, "category_id": cat_id}
+                      for cat_id in category_ids]
+                     )
 
     logger.info("Sample books seeded successfully")
 
 
+def seed_bulk_books(count: int, copies_per_book: int = 5) -> None:
+    """Seed a large synthetic catalog for load tests and benchmarks."""
+    category_ids = sql("SELECT id FROM categories ORDER BY id").scalars()
+    start = (sql("SELECT MAX(id) FROM books").scalar() or 0) + 1
+
+    with transaction():
+        sql_many("""
+                INSERT INTO books 
+                (title, author, publisher, publication_year, description, 
+                total_quantity, available_quantity)
+                VALUES 
+                (:title, :author, :publisher, :publication_year, :description, 
+                :total_quantity, :available_quantity)
+            """,
+                 ({
+                     "title": f"Bulk Book {n}",
+                     "author": f"Author {n % 5000}",
+                     "publisher": f"Publisher {n % 200}",
+                     "publication_year": 1950 + n % 75,
+                     "description": None,
+                     "total_quantity": copies_per_book,
+                     "available_quantity": copies_per_book,
+                 } for n in range(start, start + count))
+                 )
+
+        book_ids = sql("SELECT id FROM books WHERE id >= :start ORDER BY id",
+                       start=start
+                       ).scalars()
+
+        sql_many("""
+                INSERT INTO book_items 
+                (book_id, isbn, status)
+                VALUES 
+                (:book_id, :isbn, 'available')
+            """,
+                 ({"book_id": book_id, "isbn": f"BULK-{book_id}-{copy + 1}"}
+                  for book_id in book_ids
+                  for copy in range(copies_per_book))
+                 )
+
+        if category_ids:
+            sql_many("""
+                    INSERT INTO book_category 
+                    (book_id, category_id)
+                    VALUES 
+                    (:book_id, :category_id)
+                """,
+                     ({"book_id": book_id,
+                       "category_id": category_ids[book_id % len(category_ids)]}
+                      for book_id in book_ids)
+                     )
+
+    rebuild_facet_counts()
+
+    logger.info(f"Seeded {len(book_ids)} bulk books with "
+                f"{copies_per_book} copies each")
+
+
 def seed_data() -> None:
     """Main function to seed all initial data."""
     try:
@@ -220,6 +263,10 @@ def seed_data() -> None:
         seed_librarian_user()
         seed_sample_categories()
         seed_sample_books()
+        # Seeds insert books directly; count the precomputed facets once,
+        # services keep them current after that
+        if sql("SELECT 1 FROM book_facet_counts LIMIT 1").scalar() is None:
+            rebuild_facet_counts()
 
         logger.info("All seed data created successfully")
     except Exception as e:
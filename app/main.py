@@ -6,7 +6,10 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from app.db.init_db import init_db
 from app.db.seed_data import seed_data
+from app.services.suggest import build_suggest_index, start_suggest_refresh
+from app.utils.cache import start_invalidation_listener
 from app.core.config import settings
+from app.db.instrumentation import start_request_log, end_request_log
 from app.utils.rate_limiter import rate_limit_dependency
 from app.api.routes import router as api_router
 from app.websockets.manager import websocket_router
@@ -90,6 +93,19 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def query_log_middleware(request: Request, call_next):
+    log, token = start_request_log()
+    try:
+        response = await call_next(request)
+    finally:
+        end_request_log(token)
+
+    response.headers["Server-Timing"] = log.server_timing()
+    log.report(request.method, request.url.path)
+    return response
+
+
 @app.get("/", include_in_schema=False)
 async def root():
     return RedirectResponse(url="/swagger")
@@ -128,6 +144,11 @@ async def startup_event():
         init_db()
         # Seed initial data
         seed_data()
+        # Typeahead index of /books/suggest
+        build_suggest_index()
+        start_suggest_refresh()
+        # Evictions from this worker's L1 cache published by the others
+        start_invalidation_listener()
         logger.info("Application startup complete")
     except Exception as e:
         logger.error(f"Error during startup: {e}")
@@ -0,0 +1,82 @@
+from enum import Enum
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, Field
+
+
+class ExportTable(str, Enum):
+    BOOKS = "books"
+    BOOK_ITEMS = "book_items"
+    BORROW_RECORDS = "borrow_records"
+
+
+class ExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+class PoolStatus(BaseModel):
+    size: int
+    max_overflow: int
+    timeout: float
+    checked_in: int
+    checked_out: int
+    overflow: int
+    checkouts: int
+    checkout_failures: int
+    wait_time_avg_ms: float
+    wait_time_max_ms: float
+    wait_time_histogram: Dict[str, int]
+
+
+class DatabasePools(BaseModel):
+    sync: PoolStatus
+    async_: PoolStatus = Field(..., alias="async")
+
+
+class ReplicaStatus(BaseModel):
+    url: str
+    healthy: bool
+    lag_seconds: Optional[float] = None
+    checked_at: Optional[float] = None
+    error: Optional[str] = None
+
+
+class SlowQuery(BaseModel):
+    statement: str
+    count: int
+    last_ms: float
+    max_ms: float
+    last_seen: float
+    params: Dict[str, Any]
+    caller: str
+    explain: Optional[List[Dict[str, Any]]] = None
+    explained_at: Optional[float] = None
+
+
+class L1CacheStats(BaseModel):
+    entries: int
+    max_entries: int
+    hits: int
+    misses: int
+    hit_ratio: Optional[float] = None
+    evictions: int
+
+
+class L2CacheStats(BaseModel):
+    hits: int
+    misses: int
+    hit_ratio: Optional[float] = None
+
+
+class CircuitBreakerStatus(BaseModel):
+    state: str
+    failures: int
+    opened_at: Optional[float] = None
+    last_error: Optional[str] = None
+
+
+class CacheStats(BaseModel):
+    enabled: bool
+    l1: L1CacheStats
+    l2: L2CacheStats
+    breaker: CircuitBreakerStatus
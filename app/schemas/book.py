@@ -16,6 +16,9 @@ class Category(CategoryBase):
     id: int
     book_count: Optional[int] = None
 
+    class Config:
+        orm_mode = True
+
 
 class PaginatedCategoryResponse(BaseModel):
     categories: List[Category]
@@ -90,15 +93,71 @@ class Book(BookBase):
     updated_at: datetime
 
 
+class BookImportError(BaseModel):
+    # Line number in the uploaded file
+    row: int
+    errors: List[str]
+
+
+class BookImportResult(BaseModel):
+    rows: int
+    books_created: int
+    books_updated: int
+    copies_added: int
+    copies_updated: int
+    failed: int
+    errors: List[BookImportError]
+
+
+class TitleSuggestion(BaseModel):
+    id: int
+    title: str
+
+
+class BookSuggestions(BaseModel):
+    titles: List[TitleSuggestion]
+    authors: List[str]
+
+
+class FacetCount(BaseModel):
+    # Category id, publication year, or 1/0 for in/out of stock
+    value: int
+    # Category name
+    name: Optional[str] = None
+    count: int
+
+
+class BookFacets(BaseModel):
+    categories: List[FacetCount] = []
+    publication_years: List[FacetCount] = []
+    availability: List[FacetCount] = []
+
+
+class BookBatchResponse(BaseModel):
+    # In the order of the requested ids
+    books: List[Book]
+    # Requested ids with no book
+    missing: List[int] = []
+
+
 class PaginatedBookResponse(BaseModel):
     books: List[Book]
     page: int
     size: int
-    total: int
-    number_of_pages: int
+    # None when the search was made with include_total=false
+    total: Optional[int] = None
+    number_of_pages: Optional[int] = None
+    # Pass as `cursor` to fetch the next page; None on the last page and for
+    # relevance-ranked (q=) results
+    next_cursor: Optional[str] = None
+    # Counts of the matching books per facet value, with facets=true
+    facets: Optional[BookFacets] = None
 
 
 class BookSearchParams(BaseModel):
+    # Full-text search over title, author, publisher and description, ranked
+    # by relevance (paged with page; cursor is not supported)
+    q: Optional[str] = Field(None, max_length=200)
     title: Optional[str] = None
     author: Optional[str] = None
     category_id: Optional[int] = None
@@ -106,3 +165,9 @@ class BookSearchParams(BaseModel):
     available_only: Optional[bool] = False
     page: int = 0
     limit: int = 10
+    # Opaque next_cursor of the previous page; takes precedence over page
+    cursor: Optional[str] = None
+    # Skip the COUNT query (total and number_of_pages are then None)
+    include_total: bool = True
+    # Also return facet counts (total then comes from them)
+    facets: bool = False
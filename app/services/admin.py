@@ -0,0 +1,23 @@
+import logging
+
+from app.db.database import get_pool_status, get_replica_status, get_slow_queries
+from app.utils.cache import cache_stats
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_db_pool_status():
+    return get_pool_status()
+
+
+def get_db_replica_status():
+    return get_replica_status()
+
+
+def get_db_slow_queries():
+    return get_slow_queries()
+
+
+def get_cache_stats():
+    return cache_stats()
@@ -1,6 +1,6 @@
 import logging
 
-from app.db.database import sql
+from app.db.database import sql, transaction, use_primary
 from typing import Dict, Any
 from datetime import datetime, timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
@@ -18,10 +18,11 @@ logger = logging.getLogger(__name__)
 
 def login_user(user_data: UserLogin):
 
-    # Get user by email
-    user = sql("SELECT id, email, hashed_password, is_active FROM users WHERE email = :email",
-               email=user_data.email
-               ).dict()
+    # Get user by email; the account may have been registered moments ago
+    with use_primary():
+        user = sql("SELECT id, email, hashed_password, is_active FROM users WHERE email = :email",
+                   email=user_data.email
+                   ).dict()
 
     if not user:
         raise HTTPException(
@@ -92,36 +93,38 @@ def login_user(user_data: UserLogin):
 
 def register_user(user_data: UserCreate):
 
-    user_exists = sql("SELECT id FROM users WHERE email = :email",
-                      email=user_data.email
-                      ).scalar()
-
-    if user_exists:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="User with this email already exists"
-        )
-
+    # Hash before taking a connection; bcrypt is deliberately slow
     hashed_password = get_password_hash(user_data.password)
     now = datetime.utcnow()
 
-    sql("""
-            INSERT INTO users 
-            (email, first_name, last_name, hashed_password, role_id, is_active)
-            VALUES 
-            (:email, :first_name, :last_name, :hashed_password, :role_id, TRUE)
-        """,
-        email=user_data.email,
-        first_name=user_data.first_name,
-        last_name=user_data.last_name,
-        hashed_password=hashed_password,
-        role_id=user_data.role_id
-
-        )
-
-    new_user_id = sql("SELECT id FROM users WHERE email = :email",
-                      email=user_data.email
-                      ).scalar()
+    with transaction():
+        user_exists = sql("SELECT id FROM users WHERE email = :email",
+                          email=user_data.email
+                          ).scalar()
+
+        if user_exists:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="User with this email already exists"
+            )
+
+        sql("""
+                INSERT INTO users 
+                (email, first_name, last_name, hashed_password, role_id, is_active)
+                VALUES 
+                (:email, :first_name, :last_name, :hashed_password, :role_id, TRUE)
+            """,
+            email=user_data.email,
+            first_name=user_data.first_name,
+            last_name=user_data.last_name,
+            hashed_password=hashed_password,
+            role_id=user_data.role_id
+
+            )
+
+        new_user_id = sql("SELECT id FROM users WHERE email = :email",
+                          email=user_data.email
+                          ).scalar()
 
     return {
         "id": new_user_id,
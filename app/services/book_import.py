@@ -0,0 +1,410 @@
+"""
+Bulk catalog import from an uploaded CSV or JSONL file.
+
+Each row has the fields of BookCreate and adds one copy (isbn, location) of
+its book. Categories are given as category_ids or by name in `categories`;
+in CSV both are "|"-separated. The file is streamed and imported
+IMPORT_CHUNK_SIZE rows at a time. Each chunk runs in one transaction with a
+fixed number of statements, however many rows it has: a few SELECTs, and
+writes that are all INSERT ... VALUES, upserts for the rows that already
+exist, which the MySQL driver sends as multi-row statements.
+
+Books are matched on (title, author) like create_book. A matched book gets
+the details the row provides, its new categories and the copy. A copy whose
+ISBN already exists has its location updated, unless the ISBN belongs to
+another book. Invalid rows are skipped and reported by line number; the
+other rows are imported. A chunk the database rejects is retried in halves
+until the rows it rejects are found. The caches and the suggest index are
+updated after each chunk, so memory does not grow with the file.
+"""
+import codecs
+import csv
+import json
+import logging
+from itertools import islice
+
+from fastapi import HTTPException, status
+from pydantic import ValidationError
+from sqlalchemy.exc import DataError, IntegrityError
+
+from app.core.config import settings
+from app.db.database import dialect_name, sql, sql_many, transaction
+from app.db.dialects import upsert_clause
+from app.schemas.book import BookCreate
+from app.services.facets import adjust_facet_counts, book_facet_values
+from app.services.suggest import index_books
+from app.utils.cache import bump_generation, delete_many_cached
+
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+
+# Errors caused by the values of some row, rather than by the database
+_ROW_ERRORS = (IntegrityError, DataError)
+
+# CSV columns holding lists
+_LIST_FIELDS = ("category_ids", "categories")
+
+
+def file_format(filename, requested=None) -> str:
+
+    if requested:
+        if requested not in FORMATS.values():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unsupported format '{requested}', use csv or jsonl"
+            )
+        return requested
+
+    for suffix, name in FORMATS.items():
+        if (filename or "").lower().endswith(suffix):
+            return name
+
+    raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Cannot tell the file format from its name, pass format=csv or format=jsonl"
+    )
+
+
+def _csv_rows(file):
+    """(line number, row data, error) of each CSV record."""
+    reader = csv.DictReader(codecs.getreader("utf-8-sig")(file))
+    for row in reader:
+        data = {}
+        for field, value in row.items():
+            # Values beyond the header are collected under None
+            if field is None or value is None:
+                continue
+            value = value.strip()
+            if not value:
+                continue
+            if field in _LIST_FIELDS:
+                value = [item.strip() for item in value.split("|") if item.strip()]
+            data[field] = value
+        yield reader.line_num, data, None
+
+
+def _jsonl_rows(file):
+    for line_number, line in enumerate(codecs.getreader("utf-8-sig")(file), 1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, f"invalid JSON: {e}"
+            continue
+        if not isinstance(data, dict):
+            yield line_number, None, "expected a JSON object"
+            continue
+        yield line_number, data, None
+
+
+def _load_categories():
+
+    categories = sql("SELECT id, name FROM categories").dicts()
+
+    return ({category['id'] for category in categories},
+            {category['name'].casefold(): category['id'] for category in categories})
+
+
+def _validate_row(data, category_ids, category_names):
+    """The BookCreate and category ids of a row, or its errors."""
+    data = dict(data)
+    names = data.pop("categories", None) or []
+    if isinstance(names, str):
+        names = [names]
+
+    try:
+        book = BookCreate(**data)
+    except ValidationError as e:
+        return None, None, [
+            f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+            for error in e.errors()
+        ]
+
+    errors = [f"category_ids: category {category_id} does not exist"
+              for category_id in book.category_ids
+              if category_id not in category_ids]
+    row_category_ids = list(book.category_ids)
+
+    for name in names:
+        category_id = category_names.get(str(name).casefold())
+        if category_id is None:
+            errors.append(f"categories: category '{name}' does not exist")
+        else:
+            row_category_ids.append(category_id)
+
+    if errors:
+        return None, None, errors
+    return book, list(dict.fromkeys(row_category_ids)), None
+
+
+def _book_key(title, author):
+    # Case-insensitive, like the unique (title, author) index on MySQL
+    return title.casefold(), author.casefold()
+
+
+def _import_chunk(rows):
+    """
+    Import validated rows: (line, BookCreate, category ids) in one
+    transaction. Returns the chunk's counts and errors, and the imported
+    books for the caches and indexes.
+    """
+    result = {
+        "books_created": 0,
+        "books_updated": 0,
+        "copies_added": 0,
+        "copies_updated": 0,
+        "errors": [],
+    }
+
+    with transaction():
+        items = sql("SELECT isbn, book_id FROM book_items WHERE isbn IN :isbns",
+                    isbns=[book.isbn for _, book, _ in rows]
+                    ).dicts()
+        isbn_books = {item['isbn']: item['book_id'] for item in items}
+
+        existing = sql("""
+                SELECT id, title, author, publication_year, available_quantity
+                FROM books WHERE title IN :titles
+            """,
+                       titles=list({book.title for _, book, _ in rows})
+                       ).dicts()
+        books = {_book_key(book['title'], book['author']): book
+                 for book in existing}
+
+        # Rows grouped by book; ISBN conflicts are reported before any write
+        planned = {}
+        seen_isbns = set()
+        for line, book, category_ids in rows:
+            key = _book_key(book.title, book.author)
+            owner = isbn_books.get(book.isbn)
+            if book.isbn in seen_isbns or (
+                    owner is not None and
+                    (key not in books or books[key]['id'] != owner)):
+                result["errors"].append({
+                    "row": line,
+                    "errors": [f"isbn: '{book.isbn}' already belongs to another copy"]
+                })
+                continue
+            seen_isbns.add(book.isbn)
+
+            entry = planned.setdefault(key, {"book": book, "category_ids": [],
+                                             "copies": []})
+            entry["category_ids"].extend(category_ids)
+            entry["copies"].append(book)
+
+        if not planned:
+            return result, []
+
+        new_keys = [key for key in planned if key not in books]
+        old_keys = {key for key in planned if key in books}
+
+        # Copies each book gains; a row with a known ISBN moves its copy
+        new_copies = {
+            key: sum(1 for copy in entry["copies"] if copy.isbn not in isbn_books)
+            for key, entry in planned.items()
+        }
+
+        if new_keys:
+            sql_many("""
+                    INSERT INTO books
+                    (title, author, publisher, publication_year, description,
+                     total_quantity, available_quantity, created_at, updated_at)
+                    VALUES
+                    (:title, :author, :publisher, :publication_year, :description,
+                     :copies, :copies, NOW(), NOW())
+                """,
+                     [dict(planned[key]["book"].dict(include={
+                         "title", "author", "publisher", "publication_year",
+                         "description"}), copies=new_copies[key])
+                      for key in new_keys]
+                     )
+
+            created = sql("""
+                    SELECT id, title, author, publication_year, available_quantity
+                    FROM books WHERE title IN :titles
+                """,
+                          titles=list({planned[key]["book"].title
+                                       for key in new_keys})
+                          ).dicts()
+            for book in created:
+                books.setdefault(_book_key(book['title'], book['author']), book)
+
+        # Existing books, all in one upsert that never inserts: details only
+        # overwrite what the rows provide, the new copies add to the stock
+        sql_many("""
+                INSERT INTO books
+                (id, title, author, publisher, publication_year, description,
+                 total_quantity, available_quantity)
+                VALUES
+                (:id, :title, :author, :publisher, :publication_year, :description,
+                 :copies, :copies)
+            """ + upsert_clause(dialect_name(), ("id",),
+                                ("total_quantity", "available_quantity"),
+                                increment=True,
+                                coalesce=("publisher", "publication_year",
+                                          "description")),
+                 [{"id": books[key]['id'],
+                   "title": books[key]['title'],
+                   "author": books[key]['author'],
+                   "publisher": planned[key]["book"].publisher,
+                   "publication_year": planned[key]["book"].publication_year,
+                   "description": planned[key]["book"].description,
+                   "copies": new_copies[key]}
+                  for key in old_keys]
+                 )
+
+        old_categories = {}
+        if old_keys:
+            pairs = sql("""
+                    SELECT book_id, category_id FROM book_category
+                    WHERE book_id IN :book_ids
+                """,
+                        book_ids=[books[key]['id'] for key in old_keys]
+                        ).dicts()
+            for pair in pairs:
+                old_categories.setdefault(pair['book_id'], []).append(
+                    pair['category_id'])
+
+        items, new_pairs = [], []
+        added, removed = [], []
+        for key, entry in planned.items():
+            book = books[key]
+            copies = new_copies[key]
+            items.extend({"book_id": book['id'], "isbn": copy.isbn,
+                          "location": copy.location}
+                         for copy in entry["copies"])
+            result["copies_added"] += copies
+            result["copies_updated"] += len(entry["copies"]) - copies
+
+            categories = old_categories.get(book['id'], [])
+            for category_id in dict.fromkeys(entry["category_ids"]):
+                if category_id not in categories:
+                    new_pairs.append({"book_id": book['id'],
+                                      "category_id": category_id})
+
+            # Facet counts: the book as it was, and as it is after the import
+            # (created books were read back with their copies)
+            after = {
+                "publication_year": entry["book"].publication_year
+                if entry["book"].publication_year is not None
+                else book['publication_year'],
+                "available_quantity": book['available_quantity'] +
+                (copies if key in old_keys else 0),
+            }
+            if key in old_keys:
+                removed.extend(book_facet_values(book, categories))
+            added.extend(book_facet_values(after, list(dict.fromkeys(
+                categories + entry["category_ids"]))))
+
+        # New copies, and the new location of known ones, in one upsert
+        sql_many("""
+                INSERT INTO book_items (book_id, isbn, location, status)
+                VALUES (:book_id, :isbn, :location, 'available')
+            """ + upsert_clause(dialect_name(), ("isbn",), ("location",)),
+                 items
+                 )
+
+        sql_many("""
+                INSERT INTO book_category (book_id, category_id)
+                VALUES (:book_id, :category_id)
+            """,
+                 new_pairs
+                 )
+
+        adjust_facet_counts(added=added, removed=removed)
+
+    result["books_created"] = len(new_keys)
+    result["books_updated"] = len(old_keys)
+
+    return result, [books[key] for key in planned]
+
+
+def _import_rows(rows, result, books):
+    """
+    Import validated rows, adding their counts and errors to result and the
+    imported books to books. Rows the database rejects are split in halves
+    and retried, so the other rows are imported and the error is reported
+    on the row that causes it.
+    """
+    try:
+        chunk_result, chunk_books = _import_chunk(rows)
+    except _ROW_ERRORS as e:
+        if len(rows) == 1:
+            result["errors"].append({
+                "row": rows[0][0],
+                "errors": [f"not imported: {getattr(e, 'orig', e)}"]
+            })
+            return
+        middle = len(rows) // 2
+        _import_rows(rows[:middle], result, books)
+        _import_rows(rows[middle:], result, books)
+        return
+    except Exception as e:
+        logger.error(f"Bulk import chunk failed: {e}")
+        result["errors"].extend(
+            {"row": line, "errors": [f"not imported, the chunk failed: {e}"]}
+            for line, _, _ in rows)
+        return
+
+    for field, value in chunk_result.items():
+        result[field] += value
+    books.extend(chunk_books)
+
+
+def _refresh_caches(books):
+
+    delete_many_cached([f"book:{book['id']}" for book in books])
+    bump_generation("books", "books:availability", "books:categories")
+    index_books(books)
+
+
+def import_books(file, file_format: str):
+
+    rows = _csv_rows(file) if file_format == "csv" else _jsonl_rows(file)
+    category_ids, category_names = _load_categories()
+
+    result = {
+        "rows": 0,
+        "books_created": 0,
+        "books_updated": 0,
+        "copies_added": 0,
+        "copies_updated": 0,
+        "errors": [],
+    }
+
+    while True:
+        chunk = list(islice(rows, settings.IMPORT_CHUNK_SIZE))
+        if not chunk:
+            break
+        result["rows"] += len(chunk)
+
+        valid = []
+        for line, data, error in chunk:
+            if error:
+                result["errors"].append({"row": line, "errors": [error]})
+                continue
+            book, book_category_ids, errors = _validate_row(
+                data, category_ids, category_names)
+            if errors:
+                result["errors"].append({"row": line, "errors": errors})
+            else:
+                valid.append((line, book, book_category_ids))
+
+        if not valid:
+            continue
+
+        books = []
+        _import_rows(valid, result, books)
+        if books:
+            _refresh_caches(books)
+
+    result["errors"].sort(key=lambda error: error["row"])
+    result["failed"] = len(result["errors"])
+    logger.info(f"Bulk import: {result['rows']} rows, {result['books_created']} "
+                f"books created, {result['books_updated']} updated, "
+                f"{result['failed']} failed")
+
+    return result
@@ -1,9 +1,26 @@
+import base64
+import hashlib
+import json
 import logging
 
-from app.db.database import sql
+from app.core.config import settings
+from app.db.database import dialect_name, sql, sql_async, sql_many, transaction
+from app.db.dialects import fulltext_search
+from app.db.loaders import Loader
+from app.db.models import BOOK_TEXT_COLUMNS
 from fastapi import HTTPException, status
-from app.schemas.book import CategoryCreate, Category, BookCreate, BookSearchParams, BookUpdate, BookItemCreate
-from app.utils.cache import get_cached, set_cached, delete_cached, clear_cache_pattern
+from app.schemas.book import CategoryCreate, BookCreate, BookSearchParams, BookUpdate, BookItemCreate
+from app.services.facets import (
+    AVAILABILITY_CHANGE_QUERY, adjust_facet_counts, book_facet_values,
+    facets_query, facets_response, facets_total
+)
+from app.services.suggest import index_book, unindex_book
+from app.utils.cache import (
+    get_cached, set_cached, delete_cached, generation_key, bump_generation, get_cached_async,
+    set_cached_async, delete_cached_async, get_many_cached_async,
+    set_many_cached_async, generation_key_async, bump_generation_async,
+    get_or_fill_async
+)
 
 
 logger = logging.getLogger(__name__)
@@ -11,26 +28,29 @@ logger = logging.getLogger(__name__)
 
 def create_category(category: CategoryCreate):
 
-    existing = sql("SELECT id FROM categories WHERE name = :name",
-                   name=category.name
-                   ).scalar()
+    with transaction():
+        existing = sql("SELECT id FROM categories WHERE name = :name",
+                       name=category.name
+                       ).scalar()
 
-    if existing:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Category with name '{category.name}' already exists"
-        )
+        if existing:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Category with name '{category.name}' already exists"
+            )
 
-    sql("""
-            INSERT INTO categories (name)
-            VALUES (:name)
-        """,
-        name=category.name
-        )
+        category_id = sql("""
+                INSERT INTO categories (name)
+                VALUES (:name)
+            """,
+                          name=category.name
+                          ).lastrowid()
+
+        category_data = sql("SELECT * FROM categories WHERE id = :category_id",
+                            category_id=category_id
+                            ).dict()
 
-    category_data = sql("SELECT * FROM categories WHERE name = :name",
-                        name=category.name
-                        ).dict()
+    bump_generation("categories")
 
     return {
         "id": category_data['id'],
@@ -41,56 +61,87 @@ def create_category(category: CategoryCreate):
     }
 
 
+def _categories_cache_key(page: int, limit: int):
+    """
+    Cache key of a page of categories, or None when caching is off.
+
+    Listings change only when a category is created ("categories") or books
+    join or leave categories ("books:categories"), so the key embeds both
+    generations and the entry needs no short TTL.
+    """
+    return generation_key("categories", ["categories", "books:categories"],
+                          page, limit)
+
+
 def get_categories(page: int, limit: int):
 
+    cache_key = _categories_cache_key(page, limit)
+    cached = get_cached(cache_key) if cache_key else None
+    if cached:
+        return cached
+
     skip = page * limit
 
+    # Book counts are maintained in book_facet_counts by the book writes,
+    # so this is one primary key lookup per listed category
     categories = sql("""
             SELECT c.id, c.name, c.created_at, c.updated_at,
-                   COUNT(bc.book_id) as book_count
+                   COALESCE(f.book_count, 0) as book_count
             FROM categories c
-            LEFT JOIN book_category bc ON c.id = bc.category_id
-            GROUP BY c.id
+            LEFT JOIN book_facet_counts f
+                ON f.facet = 'category' AND f.value = c.id
             ORDER BY c.name
             LIMIT :limit OFFSET :skip
         """,
                      skip=skip, limit=limit
-                     ).dicts()
+                     ).records()
 
     total = sql(""" SELECT COUNT(*) FROM categories """).scalar()
 
-    number_of_pages = (len(total) // limit) + \
-        (1 if len(total) % limit != 0 else 0)
-
-    categories: list[Category] = [
-        {
-            "id": cat['id'],
-            "name": cat['name'],
-            "book_count": cat['book_count'],
-            "created_at": cat['created_at'],
-            "updated_at": cat['updated_at']
-        }
-        for cat in categories
-    ]
-    return {
+    number_of_pages = (total // limit) + \
+        (1 if total % limit != 0 else 0)
+
+    response = {
         "categories": categories,
         "page": page,
         "size": limit,
         "total": total,
         "number_of_pages": number_of_pages
     }
+    if cache_key:
+        set_cached(cache_key, response, ttl=settings.CATEGORIES_CACHE_TTL)
 
+    return response
 
-def search_books(params: BookSearchParams):
 
-    query = """
-        SELECT DISTINCT b.* FROM books b
-        JOIN book_category bc ON b.id = bc.book_id
-        WHERE 1=1
-    """
+def _encode_cursor(book):
+    position = json.dumps([book["title"], book["id"]]).encode()
+    return base64.urlsafe_b64encode(position).decode()
+
+
+def _decode_cursor(cursor: str):
+    try:
+        title, book_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(title), int(book_id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def _search_books_conditions(params: BookSearchParams):
+
+    joins = ""
     conditions = []
     query_params = {}
 
+    if params.q:
+        joins, condition, _, terms = fulltext_search(
+            dialect_name(), "books", "b", BOOK_TEXT_COLUMNS, params.q)
+        conditions.append(condition)
+        query_params["q"] = terms
+
     if params.title:
         conditions.append("b.title LIKE :title")
         query_params["title"] = f"%{params.title}%"
@@ -104,279 +155,636 @@ def search_books(params: BookSearchParams):
         query_params["publication_year"] = params.publication_year
 
     if params.category_id:
-        conditions.append("bc.category_id = :category_id")
+        # EXISTS instead of JOIN + DISTINCT keeps the (title, id) index order
+        conditions.append("""EXISTS (
+            SELECT 1 FROM book_category bc
+            WHERE bc.book_id = b.id AND bc.category_id = :category_id
+        )""")
         query_params["category_id"] = params.category_id
 
     if params.available_only:
         conditions.append("b.available_quantity > 0")
 
-    if conditions:
-        query += " AND " + " AND ".join(conditions)
+    return joins, conditions, query_params
 
-    total_books = sql(query, **query_params).dicts()
 
-    offset = params.page * params.limit
-    query += " ORDER BY b.title LIMIT :limit OFFSET :offset"
-    query_params["limit"] = params.limit
-    query_params["offset"] = offset
+def _where(conditions):
+    return " WHERE " + " AND ".join(conditions) if conditions else ""
 
-    books = sql(query, **query_params).dicts()
 
-    number_of_pages = (len(total_books) // params.limit) + \
-        (1 if len(total_books) % params.limit != 0 else 0)
+def _search_books_query(params: BookSearchParams):
+    """
+    One page of books in (title, id) order, or by relevance for a q= search.
 
-    for book in books:
-        book['categories'] = get_book_categories(book['id'])
+    With a cursor the page starts right after the cursor's (title, id), so it
+    is an index range scan whatever the depth. Without one, `page` falls back
+    to OFFSET; relevance-ranked results are always paged that way. One extra
+    row is fetched to tell whether a next page exists.
+    """
+    joins, conditions, query_params = _search_books_conditions(params)
+    order_by = "b.title, b.id"
+
+    if params.q:
+        if params.cursor:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Results of a q search are paged with page, not cursor"
+            )
+        _, _, relevance, _ = fulltext_search(
+            dialect_name(), "books", "b", BOOK_TEXT_COLUMNS, params.q)
+        order_by = f"{relevance} DESC, b.id"
+
+    if params.cursor:
+        cursor_title, cursor_id = _decode_cursor(params.cursor)
+        conditions.append("b.title >= :cursor_title AND "
+                          "(b.title > :cursor_title OR b.id > :cursor_id)")
+        query_params.update(cursor_title=cursor_title, cursor_id=cursor_id)
+
+    query = f"SELECT b.* FROM books b{joins}" + _where(conditions) + \
+        f" ORDER BY {order_by} LIMIT :limit"
+    query_params["limit"] = params.limit + 1
+
+    if not params.cursor and params.page:
+        query += " OFFSET :offset"
+        query_params["offset"] = params.page * params.limit
+
+    return query, query_params
+
+
+def _count_books_query(params: BookSearchParams):
+
+    joins, conditions, query_params = _search_books_conditions(params)
+    return "SELECT COUNT(*) FROM books b" + joins + _where(conditions), \
+        query_params
+
+
+def _facets_query(params: BookSearchParams):
+
+    joins, conditions, query_params = _search_books_conditions(params)
+    return facets_query(joins, conditions), query_params
+
+
+def _split_page(params: BookSearchParams, books):
+    """Drop the look-ahead row of _search_books_query, turning it into a cursor."""
+
+    if len(books) <= params.limit:
+        return books, None
+
+    books = books[:params.limit]
+    next_cursor = None if params.q else _encode_cursor(books[-1])
+
+    return books, next_cursor
+
+
+def _search_books_response(params: BookSearchParams, books, total, next_cursor,
+                           facets=None):
+
+    number_of_pages = None
+    if total is not None:
+        number_of_pages = (total // params.limit) + \
+            (1 if total % params.limit != 0 else 0)
 
     return {
         "books": books,
         "page": params.page,
         "size": params.limit,
-        "total": len(total_books),
-        "number_of_pages": number_of_pages
+        "total": total,
+        "number_of_pages": number_of_pages,
+        "next_cursor": next_cursor,
+        "facets": facets
     }
 
 
-def get_book_categories(book_id):
-    return sql('''
-        SELECT c.id, c.name
-        FROM book_category bc
-        LEFT JOIN categories c ON c.id = bc.category_id
-        WHERE bc.book_id = :book_id
-    ''',
-               book_id=book_id).dicts()
+def _normalize_search_params(params: BookSearchParams):
+    """
+    Canonical form of a search, so equivalent requests share a cache entry.
 
+    Text filters match case-insensitively, so they are trimmed and
+    lower-cased; blank ones are dropped.
+    """
+    data = params.dict()
+    for field in ("q", "title", "author"):
+        data[field] = (data[field] or "").strip().lower() or None
+    data["available_only"] = bool(data["available_only"])
 
-def create_book(book: BookCreate):
+    return BookSearchParams(**data)
+
+
+def _search_generations(params: BookSearchParams):
+    """
+    Generations a cached search depends on.
+
+    The catalog generation, plus the generation of the filtered category and
+    of availability when the search depends on them, so writes invalidate
+    exactly the searches they can change. Facet counts depend on every
+    book's availability and categories.
+    """
+    names = ["books"]
+    if params.category_id:
+        names.append(f"books:category:{params.category_id}")
+    if params.available_only or params.facets:
+        names.append("books:availability")
+    if params.facets:
+        names.append("books:categories")
+    return names
+
+
+def _search_digest(params: BookSearchParams):
+    return hashlib.sha1(
+        json.dumps(params.dict(), sort_keys=True).encode()).hexdigest()
+
+
+async def _search_cache_key_async(params: BookSearchParams):
+    return await generation_key_async(
+        "books:search", _search_generations(params), _search_digest(params))
+
+
+def _search_page_entry(books, total, next_cursor, facets):
+    # The entry only holds ids; book payloads live in the per-book cache,
+    # so a change to one book never invalidates the searches listing it
+    return {
+        "ids": [book['id'] for book in books],
+        "total": total,
+        "next_cursor": next_cursor,
+        "facets": facets,
+    }
+
+
+async def _cache_search_page_async(cache_key, books, total, next_cursor, facets):
+
+    if cache_key is None:
+        return
+
+    await set_cached_async(
+        cache_key, _search_page_entry(books, total, next_cursor, facets),
+        ttl=settings.SEARCH_CACHE_TTL)
+    # Only the books missing from the cache: a cached one may have been
+    # refreshed, or deleted by a borrow, since this page was read
+    await set_many_cached_async({f"book:{book['id']}": book for book in books},
+                                missing_only=True)
+
+
+async def search_books_async(params: BookSearchParams):
+
+    params = _normalize_search_params(params)
+    cache_key = await _search_cache_key_async(params)
+
+    cached = await get_cached_async(cache_key) if cache_key else None
+    if cached:
+        books = await get_books_by_ids_async(cached["ids"])
+        return _search_books_response(params, books,
+                                      cached["total"], cached["next_cursor"],
+                                      cached["facets"])
+
+    query, query_params = _search_books_query(params)
+    books, next_cursor = _split_page(
+        params, (await sql_async(query, **query_params)).dicts())
+
+    total = facets = None
+    if params.facets:
+        facets_sql, facets_params = _facets_query(params)
+        facets = facets_response(
+            (await sql_async(facets_sql, **facets_params)).dicts())
+        # The availability counts add up to the hits, no COUNT needed
+        total = facets_total(facets)
+    elif params.include_total:
+        count_query, count_params = _count_books_query(params)
+        total = (await sql_async(count_query, **count_params)).scalar()
+
+    _attach_categories(books, await book_categories.load_many_async(
+        book['id'] for book in books))
+    await _cache_search_page_async(cache_key, books, total, next_cursor, facets)
+
+    return _search_books_response(params, books, total, next_cursor, facets)
+
+
+# Categories of many books in one query
+book_categories = Loader('''
+    SELECT bc.book_id, c.id, c.name
+    FROM book_category bc
+    JOIN categories c ON c.id = bc.category_id
+    WHERE bc.book_id IN :keys
+''', key="book_id", many=True)
+
+
+def _attach_categories(books, categories):
+    for book in books:
+        book['categories'] = categories.get(book['id'], [])
+
+
+# The book and its categories in one query: one row per category, or a
+# single row with NULL category columns
+BOOK_WITH_CATEGORIES_QUERY = '''
+    SELECT b.*, c.id AS category_id, c.name AS category_name
+    FROM books b
+    LEFT JOIN book_category bc ON bc.book_id = b.id
+    LEFT JOIN categories c ON c.id = bc.category_id
+    WHERE b.id = :book_id
+'''
+
+
+def _book_with_categories(rows):
+
+    if not rows:
+        return None
+
+    book = dict(rows[0])
+    del book['category_id'], book['category_name']
+    book['categories'] = [
+        {"id": row['category_id'], "name": row['category_name']}
+        for row in rows if row['category_id'] is not None
+    ]
+
+    return book
+
+
+books_by_id = Loader("SELECT * FROM books WHERE id IN :keys")
+
+
+def _books_in_order(book_ids, cached, loaded):
+    books = []
+    for book_id, book in zip(book_ids, cached):
+        book = book or loaded.get(book_id)
+        # Deleted since the ids were cached
+        if book:
+            books.append(book)
+    return books
+
+
+async def get_books_by_ids_async(book_ids):
+    """
+    Books (with categories) in the order of book_ids.
+
+    Served from the per-book cache with one MGET; misses are loaded with one
+    query per relation and written back unless another request cached them
+    meanwhile.
+    """
+    cached = await get_many_cached_async([f"book:{book_id}" for book_id in book_ids])
+    missing = [book_id for book_id, book in zip(book_ids, cached) if not book]
+
+    loaded = {}
+    if missing:
+        loaded = await books_by_id.load_many_async(missing)
+        _attach_categories(loaded.values(),
+                           await book_categories.load_many_async(loaded))
+        await set_many_cached_async({f"book:{book_id}": book
+                                     for book_id, book in loaded.items()},
+                                    missing_only=True)
+
+    return _books_in_order(book_ids, cached, loaded)
+
+
+# Most ids one /books/batch request may ask for
+MAX_BATCH_BOOKS = 100
 
-    existing = sql("SELECT id FROM books WHERE title = :title AND author = :author",
-                   title=book.title, author=book.author
-                   ).scalar()
 
-    if existing:
+def _parse_book_ids(ids: str):
+
+    try:
+        book_ids = [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Book with ISBN '{book}' already exists"
+            detail="ids must be a comma-separated list of book ids"
         )
 
-    # Create new book
-    sql("""
-            INSERT INTO books 
-            (title, author, publisher, publication_year, description, 
-             total_quantity, available_quantity, created_at, updated_at)
-            VALUES 
-            (:title, :author, :publisher, :publication_year, :description, 
-             :total_quantity, :available_quantity, NOW(), NOW())
-        """,
-        title=book.title,
-        author=book.author,
-        publisher=book.publisher,
-        publication_year=book.publication_year,
-        description=book.description,
-        total_quantity=0,
-        available_quantity=0,
+    book_ids = list(dict.fromkeys(book_ids))
+    if not book_ids or len(book_ids) > MAX_BATCH_BOOKS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Pass between 1 and {MAX_BATCH_BOOKS} book ids"
         )
 
-    book_id = sql("SELECT id FROM books WHERE title = :title AND author = :author",
-                  title=book.title, author=book.author
-                  ).scalar()
+    return book_ids
+
+
+async def get_books_batch_async(ids: str):
+
+    book_ids = _parse_book_ids(ids)
+    books = await get_books_by_ids_async(book_ids)
+    found = {book['id'] for book in books}
+
+    return {
+        "books": books,
+        "missing": [book_id for book_id in book_ids if book_id not in found]
+    }
+
+
+def invalidate_book_cache(book_id, availability_changed=False):
+    """
+    Drop a book's cached payload after a write that changed it.
+
+    availability_changed: the book went in or out of stock, so searches with
+    available_only may now list different books.
+    """
+    delete_cached(f"book:{book_id}")
+    if availability_changed:
+        bump_generation("books:availability")
+
+
+async def invalidate_book_cache_async(book_id, availability_changed=False):
+
+    await delete_cached_async(f"book:{book_id}")
+    if availability_changed:
+        await bump_generation_async("books:availability")
 
-    for category_id in book.category_ids:
 
-        category = sql("SELECT id FROM categories WHERE id = :category_id",
-                       category_id=category_id
+def create_book(book: BookCreate):
+
+    with transaction():
+        existing = sql("SELECT id FROM books WHERE title = :title AND author = :author",
+                       title=book.title, author=book.author
                        ).scalar()
 
-        if not category:
+        if existing:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Category with ID {category_id} does not exist"
+                detail=f"Book with ISBN '{book}' already exists"
             )
 
-        sql("""
-                INSERT INTO book_category (book_id, category_id)
-                VALUES (:book_id, :category_id)
+        # Create new book
+        book_id = sql("""
+                INSERT INTO books 
+                (title, author, publisher, publication_year, description, 
+                 total_quantity, available_quantity, created_at, updated_at)
+                VALUES 
+                (:title, :author, :publisher, :publication_year, :description, 
+                 :total_quantity, :available_quantity, NOW(), NOW())
             """,
-            book_id=book_id, category_id=category_id
-            )
-    book_copy = BookItemCreate(
-        book_id=book_id, isbn=book.isbn, location=book.location)
-    add_book_copy(book_copy)
+                      title=book.title,
+                      author=book.author,
+                      publisher=book.publisher,
+                      publication_year=book.publication_year,
+                      description=book.description,
+                      total_quantity=0,
+                      available_quantity=0,
+                      ).lastrowid()
+
+        category_ids = list(dict.fromkeys(book.category_ids))
+        if category_ids:
+            existing_ids = set(sql("SELECT id FROM categories WHERE id IN :category_ids",
+                                   category_ids=category_ids
+                                   ).scalars())
+
+            for category_id in category_ids:
+                if category_id not in existing_ids:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail=f"Category with ID {category_id} does not exist"
+                    )
+
+            sql_many("""
+                    INSERT INTO book_category (book_id, category_id)
+                    VALUES (:book_id, :category_id)
+                """,
+                     [{"book_id": book_id, "category_id": category_id}
+                      for category_id in category_ids]
+                     )
 
-    return get_book_by_id(book_id)
+        # Counted out of stock until add_book_copy adds the first copy
+        adjust_facet_counts(added=book_facet_values(
+            {"publication_year": book.publication_year, "available_quantity": 0},
+            category_ids))
+
+        book_copy = BookItemCreate(
+            book_id=book_id, isbn=book.isbn, location=book.location)
+        book_data = add_book_copy(book_copy)
+
+    # Any search may now list the new book
+    bump_generation("books", *(["books:categories"] if category_ids else []))
+    index_book(book_data)
+
+    return book_data
 
 
 def add_book_copy(book_copy: BookItemCreate):
-    book = sql("""
-            SELECT *
-            FROM books
-            WHERE id = :book_id
-        """,
-               book_id=book_copy.book_id
-               ).dict()
 
-    if not book:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Book not found"
-        )
+    with transaction():
+        book = sql("SELECT id, available_quantity FROM books WHERE id = :book_id",
+                   book_id=book_copy.book_id
+                   ).dict()
 
-    sql("""
-        INSERT INTO book_items (book_id, isbn, location)
-                VALUES (:book_id, :isbn, :location)
+        if not book:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Book not found"
+            )
+
+        sql("""
+            INSERT INTO book_items (book_id, isbn, location)
+                    VALUES (:book_id, :isbn, :location)
+            """,
+            book_id=book_copy.book_id, isbn=book_copy.isbn, location=book_copy.location)
+
+        sql("""
+            UPDATE books SET total_quantity = total_quantity + 1, available_quantity = available_quantity + 1
+            WHERE id = :book_id
         """,
-        book_id=book_copy.book_id, isbn=book_copy.isbn, location=book_copy.location)
+            book_id=book_copy.book_id)
+
+        sql(AVAILABILITY_CHANGE_QUERY, book_id=book_copy.book_id, quantity=1)
 
-    sql("""
-        UPDATE books SET total_quantity = total_quantity + 1, available_quantity = available_quantity + 1
-        WHERE id = :book_id
-    """,
-        book_id=book_copy.book_id)
+        book_data = get_book_by_id(book_copy.book_id)
 
-    return get_book(book_copy.book_id)
+    invalidate_book_cache(book_copy.book_id,
+                          availability_changed=not book['available_quantity'])
 
+    return book_data
 
-def get_book(book_id: int):
 
-    # Try to get from cache
-    cache_key = f"book:{book_id}"
-    cached_book = get_cached(cache_key)
-    if cached_book:
-        return cached_book
+async def get_book_async(book_id: int):
 
-    book_data = get_book_by_id(book_id)
+    # One load per key however many requests miss it together; an
+    # expiring entry is refreshed while it is still served
+    book_data = await get_or_fill_async(
+        f"book:{book_id}", lambda: get_book_by_id_async(book_id))
     if not book_data:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Book with ID {book_id} not found"
         )
 
-    # Cache the result
-    set_cached(cache_key, book_data)
-
     return book_data
 
 
 def update_book(book_id: int, book_update: BookUpdate):
 
-    # Check if book exists
-    existing = sql("SELECT * FROM books WHERE id = :book_id",
-                   book_id=book_id
-                   ).dict()
+    with transaction():
+        # Check if book exists
+        existing = sql("SELECT * FROM books WHERE id = :book_id",
+                       book_id=book_id
+                       ).dict()
 
-    if not existing:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Book with ID {book_id} not found"
-        )
+        if not existing:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Book with ID {book_id} not found"
+            )
 
-    # Build update query dynamically based on provided fields
-    update_fields = []
-    update_values = {"book_id": book_id}
+        # Build update query dynamically based on provided fields
+        update_fields = []
+        update_values = {"book_id": book_id}
 
-    if book_update.title is not None:
-        update_fields.append("title = :title")
-        update_values["title"] = book_update.title
+        if book_update.title is not None:
+            update_fields.append("title = :title")
+            update_values["title"] = book_update.title
 
-    if book_update.author is not None:
-        update_fields.append("author = :author")
-        update_values["author"] = book_update.author
+        if book_update.author is not None:
+            update_fields.append("author = :author")
+            update_values["author"] = book_update.author
 
-    if book_update.publisher is not None:
-        update_fields.append("publisher = :publisher")
-        update_values["publisher"] = book_update.publisher
+        if book_update.publisher is not None:
+            update_fields.append("publisher = :publisher")
+            update_values["publisher"] = book_update.publisher
 
-    if book_update.publication_year is not None:
-        update_fields.append("publication_year = :publication_year")
-        update_values["publication_year"] = book_update.publication_year
+        if book_update.publication_year is not None:
+            update_fields.append("publication_year = :publication_year")
+            update_values["publication_year"] = book_update.publication_year
 
-    if book_update.description is not None:
-        update_fields.append("description = :description")
-        update_values["description"] = book_update.description
+        if book_update.description is not None:
+            update_fields.append("description = :description")
+            update_values["description"] = book_update.description
 
-    if book_update.total_quantity is not None:
-        update_fields.append("total_quantity = :total_quantity")
-        update_values["total_quantity"] = book_update.total_quantity
+        if book_update.total_quantity is not None:
+            update_fields.append("total_quantity = :total_quantity")
+            update_values["total_quantity"] = book_update.total_quantity
 
-    if book_update.available_quantity is not None:
-        update_fields.append("available_quantity = :available_quantity")
-        update_values["available_quantity"] = book_update.available_quantity
+        if book_update.available_quantity is not None:
+            update_fields.append("available_quantity = :available_quantity")
+            update_values["available_quantity"] = book_update.available_quantity
 
-    if update_fields:
-        update_fields.append("updated_at = NOW()")
-        update_query = f"UPDATE books SET {', '.join(update_fields)} WHERE id = :book_id"
-        sql(update_query, **update_values)
+        if update_fields:
+            update_fields.append("updated_at = NOW()")
+            update_query = f"UPDATE books SET {', '.join(update_fields)} WHERE id = :book_id"
+            sql(update_query, **update_values)
 
-    # Update categories if provided
-    if book_update.category_ids is not None:
-        sql("DELETE FROM book_category WHERE book_id = :book_id",
+        old_categories = sql(
+            "SELECT category_id FROM book_category WHERE book_id = :book_id",
             book_id=book_id
-            )
+        ).scalars()
+        new_categories = old_categories
+
+        # Update categories if provided
+        changed_categories = set()
+        if book_update.category_ids is not None:
+            new_categories = list(dict.fromkeys(book_update.category_ids))
+            changed_categories = set(old_categories) ^ set(new_categories)
 
-        for category_id in book_update.category_ids:
-            sql("""
+            sql("DELETE FROM book_category WHERE book_id = :book_id",
+                book_id=book_id
+                )
+
+            sql_many("""
                     INSERT INTO book_category (book_id, category_id)
                     VALUES (:book_id, :category_id)
                 """,
-                book_id=book_id, category_id=category_id
-                )
+                     [{"book_id": book_id, "category_id": category_id}
+                      for category_id in new_categories]
+                     )
 
-    delete_cached(f"book:{book_id}")
-    clear_cache_pattern("books:*")
+        updated = dict(existing, **{
+            field: value for field, value in update_values.items()
+            if field in ("publication_year", "available_quantity")
+        })
+        adjust_facet_counts(added=book_facet_values(updated, new_categories),
+                            removed=book_facet_values(existing, old_categories))
+
+        book_data = get_book_by_id(book_id)
+
+    _invalidate_updated_book(book_id, book_update, existing, changed_categories)
+    index_book(book_data)
+
+    return book_data
+
+
+# Fields that decide which searches list a book, and in what order
+_LISTING_FIELDS = ("title", "author", "publisher", "publication_year",
+                   "description")
 
-    return get_book_by_id(book_id)
+
+def _invalidate_updated_book(book_id, book_update: BookUpdate, existing,
+                             changed_categories):
+
+    listing_changed = any(
+        getattr(book_update, field) is not None and
+        getattr(book_update, field) != existing[field]
+        for field in _LISTING_FIELDS
+    )
+    availability_changed = book_update.available_quantity is not None and \
+        bool(book_update.available_quantity) != bool(existing['available_quantity'])
+
+    generations = [f"books:category:{category_id}"
+                   for category_id in changed_categories]
+    if changed_categories:
+        generations.append("books:categories")
+    if listing_changed:
+        generations.append("books")
+
+    invalidate_book_cache(book_id, availability_changed)
+    if generations:
+        bump_generation(*generations)
 
 
 def get_book_by_id(book_id: int):
 
-    book = sql("""
-                SELECT *
-                FROM books
-                WHERE id = :book_id
-               """,
-               book_id=book_id
-               ).dict()
+    rows = sql(BOOK_WITH_CATEGORIES_QUERY, book_id=book_id).dicts()
 
-    if not book:
-        return None
+    return _book_with_categories(rows)
 
-    book["categories"] = get_book_categories(book["id"])
 
-    return book
+async def get_book_by_id_async(book_id: int):
+
+    rows = (await sql_async(BOOK_WITH_CATEGORIES_QUERY,
+                            book_id=book_id
+                            )).dicts()
+
+    return _book_with_categories(rows)
 
 
 def delete_book(book_id: int):
 
-    existing = sql("SELECT id FROM books WHERE id = :book_id",
-                   book_id=book_id
-                   ).scalar()
+    with transaction():
+        existing = sql("SELECT * FROM books WHERE id = :book_id",
+                       book_id=book_id
+                       ).dict()
 
-    if not existing:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Book with ID {book_id} not found"
-        )
+        if not existing:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Book with ID {book_id} not found"
+            )
 
-    # Check if any book items are currently borrowed
-    borrowed = sql("""
-            SELECT COUNT(*) FROM book_items bi
-            JOIN borrow_records br ON bi.id = br.book_item_id
-            WHERE bi.book_id = :book_id AND br.returned_date IS NULL
-        """,
-                   book_id=book_id
-                   ).scalar()
+        # Check if any book items are currently borrowed
+        borrowed = sql("""
+                SELECT COUNT(*) FROM book_items bi
+                JOIN borrow_records br ON bi.id = br.book_item_id
+                WHERE bi.book_id = :book_id AND br.returned_date IS NULL
+            """,
+                       book_id=book_id
+                       ).scalar()
 
-    if borrowed > 0:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Cannot delete book while copies are still borrowed"
-        )
+        if borrowed > 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cannot delete book while copies are still borrowed"
+            )
 
-    sql("DELETE FROM books WHERE id = :book_id",
-        book_id=book_id
-        )
+        category_ids = sql(
+            "SELECT category_id FROM book_category WHERE book_id = :book_id",
+            book_id=book_id
+        ).scalars()
+        adjust_facet_counts(removed=book_facet_values(existing, category_ids))
 
-    delete_cached(f"book:{book_id}")
-    clear_cache_pattern("books:*")
+        sql("DELETE FROM book_category WHERE book_id = :book_id",
+            book_id=book_id
+            )
+
+        sql("DELETE FROM books WHERE id = :book_id",
+            book_id=book_id
+            )
+
+    invalidate_book_cache(book_id)
+    bump_generation("books", *(["books:categories"] if category_ids else []))
+    unindex_book(book_id)
 
     return {"message": f"Book with ID {book_id} deleted successfully"}
@@ -1,28 +1,115 @@
 import logging
 
-from app.db.database import sql
+from app.db.database import dialect_name, sql, sql_async, async_transaction
+from app.db.dialects import lock_rows_clause
+from app.db.loaders import Loader
 from fastapi import HTTPException, status
 from datetime import datetime
 from app.schemas.borrow import BorrowRequest, ReturnRequest, BorrowHistoryParams
 from app.db.models import BookStatus
-from app.websockets.manager import notify_user
+from app.services.books import invalidate_book_cache_async
+from app.services.facets import AVAILABILITY_CHANGE_QUERY
+from app.websockets.manager import notify_users
 
 
 logger = logging.getLogger(__name__)
 
 
-def borrow_book(borrow_data: BorrowRequest, current_user):
-
-    user_id = current_user["id"]
-
-    # Check if book item exists and is available
-    book = sql("""
-            SELECT *
-            FROM books
-            WHERE id = :book_id
-        """,
-               book_id=borrow_data.book_id
-               ).dict()
+# Statements shared by the sync and async variants of the hot endpoints
+
+BOOK_QUERY = """
+    SELECT *
+    FROM books
+    WHERE id = :book_id
+"""
+
+# Picked after the decrement, locking the copy so that a concurrent borrow
+# of the same book takes another one (see lock_rows_clause)
+AVAILABLE_BOOK_ITEM_QUERY = """
+    SELECT id
+    FROM book_items
+    WHERE book_id = :book_id AND status = :available_status
+    LIMIT 1
+"""
+
+# Decrement atomically so concurrent borrows cannot oversell the book; the
+# row lock it takes serializes the borrows of one book until commit
+DECREMENT_AVAILABLE_QUERY = """
+    UPDATE books
+    SET available_quantity = available_quantity - 1
+    WHERE id = :book_id AND available_quantity > 0
+"""
+
+INSERT_BORROW_RECORD_QUERY = """
+    INSERT INTO borrow_records
+    (user_id, book_item_id, borrowed_date, due_date, status)
+    VALUES
+    (:user_id, :book_item_id, NOW(), :due_date, 'active')
+"""
+
+# The guard stops two borrows from taking the same copy
+MARK_ITEM_BORROWED_QUERY = """
+    UPDATE book_items 
+    SET status = 'borrowed'
+    WHERE id = :book_item_id AND status = 'available'
+"""
+
+BORROW_RECORD_FOR_RETURN_QUERY = """
+    SELECT br.*, bi.book_id
+    FROM borrow_records br
+    JOIN book_items bi ON br.book_item_id = bi.id
+    WHERE br.id = :borrow_id
+"""
+
+# The guard stops a concurrent return of the same record
+MARK_RETURNED_QUERY = """
+    UPDATE borrow_records 
+    SET returned_date = NOW(), status = 'returned'
+    WHERE id = :borrow_id AND returned_date IS NULL
+"""
+
+MARK_ITEM_AVAILABLE_QUERY = """
+    UPDATE book_items 
+    SET status = 'available', updated_at = NOW()
+    WHERE id = :book_item_id
+"""
+
+INCREMENT_AVAILABLE_QUERY = """
+    UPDATE books
+    SET available_quantity = available_quantity + 1, updated_at = NOW()
+    WHERE id = :book_id
+"""
+
+USERS_WAITING_QUERY = """
+    SELECT nq.user_id, b.title
+    FROM notification_queue nq
+    LEFT JOIN books b ON nq.book_id = b.id
+    WHERE nq.book_id = :book_id
+"""
+
+CLEAR_NOTIFICATION_QUEUE_QUERY = "DELETE FROM notification_queue WHERE book_id = :book_id"
+
+# Borrow records with their user and book details, many ids per query;
+# records, since _format_borrow_record builds the response from them
+borrow_records = Loader("""
+    SELECT 
+        br.*,
+        u.email as user_email,
+        u.first_name as user_first_name,
+        u.last_name as user_last_name,
+        bi.isbn,
+        b.id as book_id,
+        b.title,
+        b.author
+    FROM borrow_records br
+    LEFT JOIN users u ON br.user_id = u.id
+    LEFT JOIN book_items bi ON br.book_item_id = bi.id
+    LEFT JOIN books b ON bi.book_id = b.id
+    WHERE br.id IN :keys
+""", records=True)
+
+
+def _check_borrowable(book, borrow_data: BorrowRequest):
 
     if not book:
         raise HTTPException(
@@ -43,71 +130,17 @@ def borrow_book(borrow_data: BorrowRequest, current_user):
             detail="Due date cannot be in the past"
         )
 
-    book_item_id = sql(
-        '''
-        SELECT id
-        FROM book_items
-        WHERE book_id = :book_id AND status = :available_status
-        LIMIT 1
-        ''',
-        book_id=book['id'],
-        available_status=BookStatus.AVAILABLE.value,
-    ).scalar()
-
-    # Create borrow record
-    sql("""
-            INSERT INTO borrow_records
-            (user_id, book_item_id, borrowed_date, due_date, status)
-            VALUES
-            (:user_id, :book_item_id, NOW(), :due_date, 'active')
-        """,
-        user_id=user_id,
-        book_item_id=book_item_id,
-        due_date=borrow_data.due_date
-        )
-
-    borrow_id = sql("""
-                    SELECT id FROM borrow_records
-                    WHERE user_id = :user_id AND book_item_id = :book_item_id
-                    """,
-                    user_id=user_id,
-                    book_item_id=book_item_id
-                    ).scalar()
 
-    sql("""
-            UPDATE book_items 
-            SET status = 'borrowed'
-            WHERE id = :book_item_id
-        """,
-        book_item_id=book_item_id
-        )
+def _check_reserved(book_item_id, updated):
 
-    available_quantity = book['available_quantity'] - 1
-    sql("""
-            UPDATE books
-            SET available_quantity = :available_quantity
-            WHERE id = :book_id
-        """,
-        book_id=book['id'],
-        available_quantity=available_quantity,
+    if not book_item_id or not updated:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Out of stock"
         )
 
-    return get_borrow_record_by_id(borrow_id)
-
-
-def return_book(current_user, return_data: ReturnRequest):
 
-    user_id = current_user["id"]
-
-    # Get the borrow record
-    borrow_record = sql("""
-            SELECT br.*, bi.book_id
-            FROM borrow_records br
-            JOIN book_items bi ON br.book_item_id = bi.id
-            WHERE br.id = :borrow_id
-        """,
-                        borrow_id=return_data.borrow_id
-                        ).dict()
+def _check_returnable(borrow_record, current_user):
 
     if not borrow_record:
         raise HTTPException(
@@ -116,7 +149,7 @@ def return_book(current_user, return_data: ReturnRequest):
         )
 
     # Check if this is the user's borrow record or if user is a librarian
-    if borrow_record['user_id'] != user_id and current_user["role_id"] not in [1, 2]:
+    if borrow_record['user_id'] != current_user["id"] and current_user["role_id"] not in [1, 2]:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You can only return your own borrowed books"
@@ -129,61 +162,128 @@ def return_book(current_user, return_data: ReturnRequest):
             detail="This book has already been returned"
         )
 
-    # Update borrow record
-    sql("""
-            UPDATE borrow_records 
-            SET returned_date = NOW(), status = 'returned'
-            WHERE id = :borrow_id
-        """,
-        borrow_id=return_data.borrow_id
-        )
 
-    # Update book item status
-    sql("""
-            UPDATE book_items 
-            SET status = 'available', updated_at = NOW()
-            WHERE id = :book_item_id
-        """,
-        book_item_id=borrow_record['book_item_id']
-        )
+def _check_returned(updated):
 
-    # Update book available quantity
-    sql("""
-            UPDATE books
-            SET available_quantity = available_quantity + 1, updated_at = NOW()
-            WHERE id = :book_id
-        """,
-        book_id=borrow_record['book_id']
+    if not updated:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="This book has already been returned"
         )
 
-    # Check if there are users in the notification queue for this book
-    users_waiting = sql("""
-            SELECT nq.user_id, b.title
-            FROM notification_queue nq
-            LEFT JOIN books b ON nq.book_id = b.id
-            WHERE nq.book_id = :book_id
-        """,
-                        book_id=borrow_record['book_id']
-                        ).dicts()
 
-    sql("DELETE FROM notification_queue WHERE book_id = :book_id",
-        book_id=borrow_record['book_id'])
+def _book_available_message(user, book_id):
+    return {
+        "type": "book_available",
+        "message": f"The book '{user['title']}' is now available.",
+        "book_id": book_id
+    }
+
+
+async def borrow_book_async(borrow_data: BorrowRequest, current_user):
+
+    user_id = current_user["id"]
+
+    async with async_transaction():
+        # Check if book item exists and is available
+        book = (await sql_async(BOOK_QUERY,
+                                book_id=borrow_data.book_id
+                                )).dict()
+
+        _check_borrowable(book, borrow_data)
+
+        updated = (await sql_async(DECREMENT_AVAILABLE_QUERY,
+                                   book_id=book['id']
+                                   )).rowcount()
+
+        book_item_id = (await sql_async(
+            AVAILABLE_BOOK_ITEM_QUERY + lock_rows_clause(dialect_name()),
+            book_id=book['id'],
+            available_status=BookStatus.AVAILABLE.value,
+        )).scalar()
+
+        _check_reserved(book_item_id, updated)
+
+        marked = (await sql_async(MARK_ITEM_BORROWED_QUERY,
+                                  book_item_id=book_item_id
+                                  )).rowcount()
+
+        _check_reserved(book_item_id, marked)
+
+        # Matches rows only when the decrement left no copies
+        availability_changed = (await sql_async(AVAILABILITY_CHANGE_QUERY,
+                                                book_id=book['id'], quantity=0
+                                                )).rowcount() > 0
+
+        # Create borrow record
+        borrow_id = (await sql_async(INSERT_BORROW_RECORD_QUERY,
+                                     user_id=user_id,
+                                     book_item_id=book_item_id,
+                                     due_date=borrow_data.due_date
+                                     )).lastrowid()
+
+        borrow_record = await get_borrow_record_by_id_async(borrow_id)
+
+    # available_only searches change when the last copy goes out
+    await invalidate_book_cache_async(
+        book['id'], availability_changed=availability_changed)
+
+    return borrow_record
+
+
+async def return_book_async(current_user, return_data: ReturnRequest):
+
+    async with async_transaction():
+        # Get the borrow record
+        borrow_record = (await sql_async(BORROW_RECORD_FOR_RETURN_QUERY,
+                                         borrow_id=return_data.borrow_id
+                                         )).dict()
+
+        _check_returnable(borrow_record, current_user)
+
+        # Update borrow record
+        updated = (await sql_async(MARK_RETURNED_QUERY,
+                                   borrow_id=return_data.borrow_id
+                                   )).rowcount()
+
+        _check_returned(updated)
+
+        # Update book item status
+        await sql_async(MARK_ITEM_AVAILABLE_QUERY,
+                        book_item_id=borrow_record['book_item_id'])
+
+        # Update book available quantity
+        await sql_async(INCREMENT_AVAILABLE_QUERY,
+                        book_id=borrow_record['book_id'])
+        # Matches rows only when the increment brought back the first copy
+        availability_changed = (await sql_async(AVAILABILITY_CHANGE_QUERY,
+                                                book_id=borrow_record['book_id'],
+                                                quantity=1
+                                                )).rowcount() > 0
+
+        # Check if there are users in the notification queue for this book
+        users_waiting = (await sql_async(USERS_WAITING_QUERY,
+                                         book_id=borrow_record['book_id']
+                                         )).dicts()
+
+        await sql_async(CLEAR_NOTIFICATION_QUEUE_QUERY,
+                        book_id=borrow_record['book_id'])
+
+    # available_only searches change when the first copy comes back
+    await invalidate_book_cache_async(
+        borrow_record['book_id'],
+        availability_changed=availability_changed)
 
     # Notify users that the book is available
-    for user in users_waiting:
-        notify_user(
-            user_id=user["user_id"],
-            message={
-                "type": "book_available",
-                "message": f"The book '{user["title"]}' is now available.",
-                "book_id": borrow_record['book_id']
-            }
-        )
+    await notify_users({
+        user["user_id"]: _book_available_message(user, borrow_record['book_id'])
+        for user in users_waiting
+    })
 
-    return get_borrow_record_by_id(return_data.borrow_id)
+    return await get_borrow_record_by_id_async(return_data.borrow_id)
 
 
-def get_borrow_history(current_user, params: BorrowHistoryParams):
+def _borrow_history_query(current_user, params: BorrowHistoryParams):
 
     query = """
         SELECT br.id
@@ -216,29 +316,48 @@ def get_borrow_history(current_user, params: BorrowHistoryParams):
         else:
             query += " AND (br.returned_date IS NOT NULL OR br.due_date >= NOW())"
 
-    total_borrow_history = sql(query, **query_params).dicts()
+    return query, query_params
+
+
+def _paginate_borrow_history_query(params: BorrowHistoryParams, query, query_params):
 
     query += " ORDER BY br.borrowed_date DESC LIMIT :limit OFFSET :offset"
     offset = params.page * params.limit
-    query_params["limit"] = params.limit
-    query_params["offset"] = offset
+    query_params = dict(query_params, limit=params.limit, offset=offset)
+
+    return query, query_params
 
-    borrow_ids = sql(query, **query_params).scalars()
 
-    history = [get_borrow_record_by_id(id) for id in borrow_ids]
+def _borrow_history_response(params: BorrowHistoryParams, history, total):
 
-    number_of_pages = (len(total_borrow_history) // params.limit) + \
-        (1 if len(total_borrow_history) % params.limit != 0 else 0)
+    number_of_pages = (total // params.limit) + \
+        (1 if total % params.limit != 0 else 0)
 
     return {
         "borrows": history,
         "page": params.page,
         "size": params.limit,
-        "total": len(total_borrow_history),
+        "total": total,
         "number_of_pages": number_of_pages
     }
 
 
+async def get_borrow_history_async(current_user, params: BorrowHistoryParams):
+
+    query, query_params = _borrow_history_query(current_user, params)
+
+    total_borrow_history = (await sql_async(query, **query_params)).dicts()
+
+    page_query, page_params = _paginate_borrow_history_query(
+        params, query, query_params)
+    borrow_ids = (await sql_async(page_query, **page_params)).scalars()
+
+    records = await borrow_records.load_many_async(borrow_ids)
+    history = [_format_borrow_record(records.get(id)) for id in borrow_ids]
+
+    return _borrow_history_response(params, history, len(total_borrow_history))
+
+
 def notify_when_available(book_id, current_user):
     user_id = current_user["id"]
 
@@ -281,26 +400,12 @@ def notify_when_available(book_id, current_user):
     return {"message": f"You will be notified when the book '{book['title']}' becomes available."}
 
 
-def get_borrow_record_by_id(borrow_id: int):
-
-    borrow_record = sql("""
-            SELECT 
-                br.*,
-                u.email as user_email,
-                u.first_name as user_first_name,
-                u.last_name as user_last_name,
-                bi.isbn,
-                b.id as book_id,
-                b.title,
-                b.author
-            FROM borrow_records br
-            LEFT JOIN users u ON br.user_id = u.id
-            LEFT JOIN book_items bi ON br.book_item_id = bi.id
-            LEFT JOIN books b ON bi.book_id = b.id
-            WHERE br.id = :borrow_id
-        """,
-                        borrow_id=borrow_id
-                        ).dict()
+async def get_borrow_record_by_id_async(borrow_id: int):
+
+    return _format_borrow_record(await borrow_records.load_async(borrow_id))
+
+
+def _format_borrow_record(borrow_record):
 
     if not borrow_record:
         return None
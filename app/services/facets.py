@@ -0,0 +1,157 @@
+"""
+Facet counts of book searches: matching books per category, publication
+year and availability.
+
+Counts over the whole catalog are precomputed in book_facet_counts and kept
+current by the transactions that change them, so the facets of an unfiltered
+search are a read of that small table. Facets of a filtered search are
+counted over the matching books with one GROUP BY statement.
+"""
+from collections import Counter
+
+from app.db.database import dialect_name, sql, sql_many, transaction
+from app.db.dialects import upsert_clause
+from app.utils.cache import bump_generation
+
+
+CATEGORY = "category"
+YEAR = "year"
+AVAILABLE = "available"
+
+# Response field of each facet
+_FACET_FIELDS = {
+    CATEGORY: "categories",
+    YEAR: "publication_years",
+    AVAILABLE: "availability",
+}
+
+CATALOG_FACETS_QUERY = """
+    SELECT f.facet, f.value, c.name, f.book_count
+    FROM book_facet_counts f
+    LEFT JOIN categories c ON f.facet = 'category' AND c.id = f.value
+    WHERE f.book_count > 0
+"""
+
+_AVAILABLE_VALUE = "CASE WHEN b.available_quantity > 0 THEN 1 ELSE 0 END"
+
+# Moves a book between the two availability values when a stock change
+# leaves it with :quantity copies (0: the last copy went out, 1: the first
+# copy came back). Runs after the stock UPDATE in the same transaction; the
+# row lock that UPDATE holds keeps the check exact under concurrency.
+AVAILABILITY_CHANGE_QUERY = """
+    UPDATE book_facet_counts
+    SET book_count = book_count + CASE value WHEN :quantity THEN 1 ELSE -1 END
+    WHERE facet = 'available'
+      AND (SELECT available_quantity FROM books WHERE id = :book_id) = :quantity
+"""
+
+REBUILD_FACET_COUNTS_QUERY = """
+    INSERT INTO book_facet_counts (facet, value, book_count)
+    SELECT 'category', bc.category_id, COUNT(*)
+    FROM book_category bc
+    JOIN books b ON b.id = bc.book_id
+    GROUP BY bc.category_id
+    UNION ALL
+    SELECT 'year', publication_year, COUNT(*)
+    FROM books
+    WHERE publication_year IS NOT NULL
+    GROUP BY publication_year
+    UNION ALL
+    SELECT 'available', 1, COUNT(*) FROM books WHERE available_quantity > 0
+    UNION ALL
+    SELECT 'available', 0, COUNT(*) FROM books WHERE available_quantity <= 0
+"""
+
+
+def facets_query(joins: str, conditions) -> str:
+    """
+    Facet counts of the books matching `conditions` (over "books b{joins}").
+
+    Without conditions the precomputed catalog counts are read instead.
+    """
+    if not conditions:
+        return CATALOG_FACETS_QUERY
+
+    where = " WHERE " + " AND ".join(conditions)
+    return f"""
+        SELECT 'category' AS facet, fc.category_id AS value, c.name,
+               COUNT(*) AS book_count
+        FROM books b{joins}
+        JOIN book_category fc ON fc.book_id = b.id
+        JOIN categories c ON c.id = fc.category_id{where}
+        GROUP BY fc.category_id, c.name
+        UNION ALL
+        SELECT 'year', b.publication_year, NULL, COUNT(*)
+        FROM books b{joins}{where} AND b.publication_year IS NOT NULL
+        GROUP BY b.publication_year
+        UNION ALL
+        SELECT 'available', {_AVAILABLE_VALUE}, NULL, COUNT(*)
+        FROM books b{joins}{where}
+        GROUP BY {_AVAILABLE_VALUE}
+    """
+
+
+def facets_response(rows):
+
+    facets = {field: [] for field in _FACET_FIELDS.values()}
+    for row in rows:
+        if row['book_count'] > 0:
+            facets[_FACET_FIELDS[row['facet']]].append({
+                "value": row['value'],
+                "name": row['name'],
+                "count": row['book_count'],
+            })
+
+    facets["categories"].sort(key=lambda facet: (-facet["count"], facet["name"] or ""))
+    facets["publication_years"].sort(key=lambda facet: facet["value"], reverse=True)
+    facets["availability"].sort(key=lambda facet: facet["value"], reverse=True)
+
+    return facets
+
+
+def facets_total(facets) -> int:
+    """Number of matching books: each is either in or out of stock."""
+    return sum(facet["count"] for facet in facets["availability"])
+
+
+def book_facet_values(book, category_ids):
+    """The (facet, value) pairs a book is counted under."""
+    values = [(CATEGORY, category_id) for category_id in category_ids]
+    if book['publication_year'] is not None:
+        values.append((YEAR, book['publication_year']))
+    values.append((AVAILABLE, int(book['available_quantity'] > 0)))
+    return values
+
+
+def adjust_facet_counts(added=(), removed=()) -> None:
+    """
+    Count a book under the facet values `added` and no longer under
+    `removed`, in one statement. Call it inside the transaction of the write.
+    """
+    deltas = Counter(added)
+    deltas.subtract(removed)
+    rows = [{"facet": facet, "value": value, "delta": delta}
+            for (facet, value), delta in deltas.items() if delta]
+    if not rows:
+        return
+
+    sql_many("""
+            INSERT INTO book_facet_counts (facet, value, book_count)
+            VALUES (:facet, :value, :delta)
+        """ + upsert_clause(dialect_name(), ("facet", "value"),
+                            ("book_count",), increment=True),
+             rows
+             )
+
+
+def rebuild_facet_counts() -> None:
+    """
+    Recount every facet value, e.g. after a bulk load that bypassed the
+    services or to repair drift.
+    """
+    with transaction():
+        sql("DELETE FROM book_facet_counts")
+        sql(REBUILD_FACET_COUNTS_QUERY)
+
+    # Category listings show the counts
+    bump_generation("books:categories")
@@ -0,0 +1,122 @@
+"""
+Typeahead suggestions for the catalog search box, served from in-process
+prefix indexes of book titles and authors instead of LIKE scans.
+
+Each worker builds the indexes at startup and updates them on the catalog
+writes it handles. A background thread applies the writes of other workers
+(books updated since its last pass) and rebuilds the indexes every
+SUGGEST_REBUILD_INTERVAL seconds, which also drops books deleted elsewhere.
+"""
+import logging
+import sys
+import threading
+import time
+
+from app.core.config import settings
+from app.db.database import sql, sql_stream
+from app.utils.prefix_index import PrefixIndex
+
+
+logger = logging.getLogger(__name__)
+
+MAX_SUGGESTIONS = 50
+
+titles = PrefixIndex()
+# One entry per book, returned once per name
+authors = PrefixIndex(distinct=True)
+
+# updated_at of the newest book indexed, where the next refresh starts
+_watermark = {"updated_at": None, "built_at": 0.0}
+
+
+def _advance_watermark(updated_at):
+    if updated_at is not None and (_watermark["updated_at"] is None or
+                                   updated_at > _watermark["updated_at"]):
+        _watermark["updated_at"] = updated_at
+
+
+def build_suggest_index() -> None:
+    """(Re)build both indexes from one streamed scan of the books table."""
+    started = time.perf_counter()
+    title_items, author_items, newest = [], [], None
+
+    with sql_stream("SELECT id, title, author, updated_at FROM books") as result:
+        for book_id, title, author, updated_at in result.iter_rows():
+            title_items.append((title, book_id))
+            # Authors repeat across books; share one string per name
+            author_items.append((sys.intern(author), book_id))
+            if newest is None or updated_at > newest:
+                newest = updated_at
+
+    titles.build(title_items)
+    authors.build(author_items)
+    _watermark["updated_at"] = newest
+    _watermark["built_at"] = time.time()
+
+    logger.info(f"Suggest index built: {len(title_items)} books in "
+                f"{(time.perf_counter() - started) * 1000:.0f} ms")
+
+
+def index_book(book) -> None:
+    """Add or replace a book's entries after a write."""
+    titles.add(book['title'], book['id'])
+    authors.add(sys.intern(book['author']), book['id'])
+
+
+def index_books(books) -> None:
+    """index_book() for many books, e.g. after a bulk import."""
+    titles.add_many((book['title'], book['id']) for book in books)
+    authors.add_many((sys.intern(book['author']), book['id']) for book in books)
+
+
+def unindex_book(book_id: int) -> None:
+    titles.remove(book_id)
+    authors.remove(book_id)
+
+
+def refresh_suggest_index() -> None:
+    """Index the books created or updated since the last build or refresh."""
+    if _watermark["updated_at"] is None:
+        build_suggest_index()
+        return
+
+    # >= since updated_at has second precision; re-indexing is idempotent
+    books = sql("""
+            SELECT id, title, author, updated_at FROM books
+            WHERE updated_at >= :since
+        """,
+                since=_watermark["updated_at"]
+                ).dicts()
+
+    index_books(books)
+    for book in books:
+        _advance_watermark(book['updated_at'])
+
+
+def _refresh_loop():
+    while True:
+        time.sleep(settings.SUGGEST_REFRESH_INTERVAL)
+        try:
+            if time.time() - _watermark["built_at"] >= settings.SUGGEST_REBUILD_INTERVAL:
+                build_suggest_index()
+            else:
+                refresh_suggest_index()
+        except Exception as e:
+            logger.warning(f"Suggest index refresh failed: {e}")
+
+
+def start_suggest_refresh() -> None:
+    thread = threading.Thread(
+        target=_refresh_loop, name="suggest-index", daemon=True)
+    thread.start()
+
+
+def suggest_books(q: str, limit: int):
+
+    limit = min(limit, MAX_SUGGESTIONS)
+
+    return {
+        "titles": [{"id": book_id, "title": title}
+                   for title, book_id in titles.search(q, limit)],
+        "authors": [author for author, _ in authors.search(q, limit)],
+    }
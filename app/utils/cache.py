@@ -1,28 +1,234 @@
+import asyncio
 import json
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+
 import redis
+import redis.asyncio
 from app.core.config import settings
+from app.utils.cache_codec import CacheCodec, get_codec
+from app.utils.circuit_breaker import CircuitBreaker
+from app.utils.local_cache import LocalCache
 
-REDIS_URL = settings.REDIS_URL if hasattr(
-    settings, 'REDIS_URL') else "redis://localhost:6379/0"
+REDIS_URL = settings.REDIS_URL
 CACHE_TTL = 3600
+# Keys per SCAN step and UNLINK of clear_cache_pattern
+SWEEP_BATCH = 500
+
+logger = logging.getLogger(__name__)
+
+# Values are stored as bytes encoded by the CACHE_CODEC codec (see
+# cache_codec), hence clients without decode_responses
+codec = CacheCodec(get_codec(settings.CACHE_CODEC),
+                   settings.CACHE_COMPRESS_MIN_BYTES)
+
+# Two tiers: an in-process L1 in front of Redis (L2). Values are kept in L1
+# encoded and decoded on every hit, so callers never share (and mutate) one
+# cached object. Deletes and generation bumps are published on
+# INVALIDATION_CHANNEL, and every worker drops the keys from its L1.
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+local_cache = LocalCache(settings.CACHE_L1_MAX_ENTRIES, settings.CACHE_L1_TTL)
+_l2_stats = {"hits": 0, "misses": 0}
+
+# Redis is reached through bounded pools (one sync, one asyncio) with short
+# socket timeouts, behind a circuit breaker: after REDIS_BREAKER_THRESHOLD
+# consecutive failures calls skip Redis, as cache misses, until a probe
+# every REDIS_BREAKER_RESET seconds finds it back. Nothing is decided at
+# import time, so a Redis that is down at boot is picked up once it is up.
+# An empty REDIS_URL turns caching off.
+CACHE_ENABLED = bool(REDIS_URL)
+
 
-try:
-    redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
-    redis_client.ping()
-    CACHE_ENABLED = True
-except:
-    CACHE_ENABLED = False
+def _pool_options():
+    return {
+        "max_connections": settings.REDIS_MAX_CONNECTIONS,
+        # Seconds to wait for a free connection
+        "timeout": settings.REDIS_POOL_TIMEOUT,
+        "socket_timeout": settings.REDIS_SOCKET_TIMEOUT,
+        "socket_connect_timeout": settings.REDIS_CONNECT_TIMEOUT,
+    }
+
+
+if CACHE_ENABLED:
+    redis_client = redis.Redis(connection_pool=redis.BlockingConnectionPool.from_url(
+        REDIS_URL, **_pool_options()))
+    async_redis_client = redis.asyncio.Redis(
+        connection_pool=redis.asyncio.BlockingConnectionPool.from_url(
+            REDIS_URL, **_pool_options()))
+else:
     redis_client = None
+    async_redis_client = None
+
+breaker = CircuitBreaker("Redis", settings.REDIS_BREAKER_THRESHOLD,
+                         settings.REDIS_BREAKER_RESET)
+
+
+_MISSING = object()
+
+
+def _failed(error):
+    # Only Redis and network errors say Redis is unhealthy
+    if isinstance(error, (redis.RedisError, OSError, asyncio.TimeoutError)):
+        breaker.failure(error)
+    else:
+        logger.warning(f"Cache call failed: {error}")
+
+
+def _run(commands):
+    """
+    Results of the commands that commands(pipe) queues, sent in one round
+    trip; None when the breaker is open or Redis fails.
+    """
+    if not breaker.allow():
+        return None
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        commands(pipe)
+        results = pipe.execute()
+    except Exception as e:
+        _failed(e)
+        return None
+    breaker.success()
+    return results
+
+
+async def _run_async(commands):
+    """_run() on the asyncio client."""
+    if not breaker.allow():
+        return None
+    try:
+        pipe = async_redis_client.pipeline(transaction=False)
+        commands(pipe)
+        results = await pipe.execute()
+    except Exception as e:
+        _failed(e)
+        return None
+    breaker.success()
+    return results
+
+
+def _decode(data):
+    """The value encoded in data, _MISSING for no data or undecodable data."""
+    if not data:
+        return _MISSING
+    try:
+        return codec.decode(data)
+    except Exception as e:
+        logger.warning(f"Undecodable cache value: {e}")
+        return _MISSING
+
+
+def _decode_or_none(data):
+    value = _decode(data)
+    return None if value is _MISSING else value
+
+
+def _count_l2(hits, misses):
+    _l2_stats["hits"] += hits
+    _l2_stats["misses"] += misses
+
+
+def _publish_invalidation(pipe, keys=(), pattern=None):
+    # Queued after the writes, so other workers evict once Redis has them
+    pipe.publish(INVALIDATION_CHANNEL,
+                 json.dumps({"keys": list(keys), "pattern": pattern}))
+
+
+def _evict(keys=(), pattern=None):
+    # Evicting only once Redis has the change keeps concurrent readers from
+    # reloading the old value into L1
+    local_cache.delete(*keys)
+    if pattern:
+        local_cache.delete_matching(pattern)
+
+
+def _apply_invalidation(message):
+    try:
+        invalidation = json.loads(message)
+    except ValueError:
+        return
+    _evict(invalidation.get("keys") or (), invalidation.get("pattern"))
+
+
+def _listen_for_invalidations():
+    delay = 1
+    while True:
+        try:
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Invalidations published while not subscribed were missed
+            local_cache.clear()
+            if delay > 1:
+                logger.info("Cache invalidation listener reconnected")
+            delay = 1
+            while True:
+                # Polls, so the socket timeout of the pool doesn't apply
+                message = pubsub.get_message(timeout=1.0)
+                if message:
+                    _apply_invalidation(message["data"])
+        except Exception as e:
+            if delay == 1:
+                logger.warning(f"Cache invalidation listener failed: {e}")
+            time.sleep(delay)
+            delay = min(delay * 2, 30)
+
+
+def start_invalidation_listener():
+    if not CACHE_ENABLED:
+        return
+
+    thread = threading.Thread(
+        target=_listen_for_invalidations, name="cache-invalidation",
+        daemon=True)
+    thread.start()
+
+
+def _cached_value(key, results):
+    """get_cached() of key from its GET results."""
+    if results is None:
+        return None
+    data = results[0]
+    if not data:
+        _count_l2(0, 1)
+        return None
+    _count_l2(1, 0)
+    # The TTL left in Redis is unknown; L1's own TTL bounds the entry
+    local_cache.set(key, data)
+    return _decode_or_none(data)
 
 
 def get_cached(key):
     if not CACHE_ENABLED:
         return None
 
+    data = local_cache.get(key)
+    if data is not None:
+        return _decode_or_none(data)
+
+    return _cached_value(key, _run(lambda pipe: pipe.get(key)))
+
+
+async def get_cached_async(key):
+    if not CACHE_ENABLED:
+        return None
+
+    data = local_cache.get(key)
+    if data is not None:
+        return _decode_or_none(data)
+
+    return _cached_value(key, await _run_async(lambda pipe: pipe.get(key)))
+
+
+def _encode(data):
     try:
-        data = redis_client.get(key)
-        return json.loads(data) if data else None
-    except:
+        return codec.encode(data)
+    except Exception as e:
+        logger.warning(f"Unencodable cache value: {e}")
         return None
 
 
@@ -30,32 +236,537 @@ def set_cached(key, data, ttl=CACHE_TTL):
     if not CACHE_ENABLED:
         return False
 
-    try:
-        redis_client.setex(key, ttl, json.dumps(data))
-        return True
-    except:
+    data = _encode(data)
+    if data is None or _run(lambda pipe: pipe.setex(key, ttl, data)) is None:
+        return False
+    local_cache.set(key, data, ttl)
+    return True
+
+
+async def set_cached_async(key, data, ttl=CACHE_TTL):
+    if not CACHE_ENABLED:
         return False
 
+    data = _encode(data)
+    if data is None or await _run_async(
+            lambda pipe: pipe.setex(key, ttl, data)) is None:
+        return False
+    local_cache.set(key, data, ttl)
+    return True
+
+
+def _delete_commands(keys):
+
+    def commands(pipe):
+        pipe.delete(*keys)
+        _publish_invalidation(pipe, keys)
+
+    return commands
+
 
 def delete_cached(key):
     if not CACHE_ENABLED:
         return False
 
-    try:
-        redis_client.delete(key)
-        return True
-    except:
+    results = _run(_delete_commands([key]))
+    _evict([key])
+    return results is not None
+
+
+async def delete_cached_async(key):
+    if not CACHE_ENABLED:
         return False
 
+    results = await _run_async(_delete_commands([key]))
+    _evict([key])
+    return results is not None
+
 
 def clear_cache_pattern(pattern):
-    if not CACHE_ENABLED:
+    """
+    Delete every key matching pattern with an incremental sweep: SCAN visits
+    the keyspace SWEEP_BATCH keys at a time and each batch is UNLINKed (freed
+    in the background), so Redis never blocks on the whole keyspace the way
+    KEYS does. Writes invalidate through generations; this is for the keys
+    a sweep really has to remove.
+    """
+    if not CACHE_ENABLED or not breaker.allow():
         return False
 
     try:
-        keys = redis_client.keys(pattern)
-        if keys:
-            redis_client.delete(*keys)
-        return True
-    except:
+        batch = []
+        for key in redis_client.scan_iter(match=pattern, count=SWEEP_BATCH):
+            batch.append(key)
+            if len(batch) >= SWEEP_BATCH:
+                redis_client.unlink(*batch)
+                batch = []
+        pipe = redis_client.pipeline(transaction=False)
+        if batch:
+            pipe.unlink(*batch)
+        _publish_invalidation(pipe, pattern=pattern)
+        pipe.execute()
+    except Exception as e:
+        _failed(e)
+        return False
+    finally:
+        _evict(pattern=pattern)
+
+    breaker.success()
+    return True
+
+
+def _l1_lookup(keys):
+    """L1 data of keys, and the positions of those L1 doesn't have."""
+    values = [local_cache.get(key) for key in keys]
+    return values, [i for i, data in enumerate(values) if data is None]
+
+
+def _merge_fetched(keys, values, missing, results):
+    """Fill values at the missing positions from an MGET's results."""
+    fetched = results[0] if results is not None else [None] * len(missing)
+    hits = 0
+    for i, data in zip(missing, fetched):
+        if data:
+            values[i] = data
+            local_cache.set(keys[i], data)
+            hits += 1
+    _count_l2(hits, len(missing) - hits)
+    return [_decode_or_none(data) for data in values]
+
+
+def get_many_cached(keys):
+    """Values of many keys in one round trip (MGET); None for misses."""
+    if not CACHE_ENABLED or not keys:
+        return [None] * len(keys)
+
+    values, missing = _l1_lookup(keys)
+    results = _run(lambda pipe: pipe.mget([keys[i] for i in missing])) \
+        if missing else None
+
+    return _merge_fetched(keys, values, missing, results)
+
+
+async def get_many_cached_async(keys):
+    if not CACHE_ENABLED or not keys:
+        return [None] * len(keys)
+
+    values, missing = _l1_lookup(keys)
+    results = await _run_async(
+        lambda pipe: pipe.mget([keys[i] for i in missing])) if missing else None
+
+    return _merge_fetched(keys, values, missing, results)
+
+
+def _encode_many(items):
+    encoded = {}
+    for key, data in items.items():
+        data = _encode(data)
+        if data is not None:
+            encoded[key] = data
+    return encoded
+
+
+def _setex_commands(encoded, ttl, missing_only=False):
+
+    def commands(pipe):
+        for key, data in encoded.items():
+            if missing_only:
+                pipe.set(key, data, ex=ttl, nx=True)
+            else:
+                pipe.setex(key, ttl, data)
+
+    return commands
+
+
+def _cache_locally(encoded, results, ttl):
+    # With missing_only a key that already held a value answers None
+    for (key, data), stored in zip(encoded.items(), results):
+        if stored:
+            local_cache.set(key, data, ttl)
+
+
+def set_many_cached(items, ttl=CACHE_TTL, missing_only=False):
+    """
+    Cache many key -> data pairs in one pipelined round trip. With
+    missing_only, keys that are already cached keep their value.
+    """
+    if not CACHE_ENABLED or not items:
+        return False
+
+    encoded = _encode_many(items)
+    results = _run(_setex_commands(encoded, ttl, missing_only))
+    if results is None:
+        return False
+    _cache_locally(encoded, results, ttl)
+    return True
+
+
+async def set_many_cached_async(items, ttl=CACHE_TTL, missing_only=False):
+    if not CACHE_ENABLED or not items:
         return False
+
+    encoded = _encode_many(items)
+    results = await _run_async(_setex_commands(encoded, ttl, missing_only))
+    if results is None:
+        return False
+    _cache_locally(encoded, results, ttl)
+    return True
+
+
+def delete_many_cached(keys):
+    """Delete many keys in one round trip."""
+    if not CACHE_ENABLED or not keys:
+        return False
+
+    keys = list(keys)
+    results = _run(_delete_commands(keys))
+    _evict(keys)
+    return results is not None
+
+
+# Generation counters: cache keys embed the current generation of what they
+# depend on, so bumping a generation invalidates every key built on it
+# without finding or deleting them (they expire with their TTL). Generations
+# are held in L1 like any key, and bumps publish an invalidation, so a cache
+# hit that depends on them stays in process.
+
+def _generations(keys, values, missing, results):
+    if missing:
+        if results is None:
+            return None
+        for i, value in zip(missing, results[0]):
+            # A generation never bumped is 0 until its first bump
+            values[i] = value or b"0"
+            local_cache.set(keys[i], values[i])
+
+    return [int(value) for value in values]
+
+
+def get_generations(names):
+    """Current generation of each name, or None when caching is off."""
+    if not CACHE_ENABLED:
+        return None
+
+    keys = [f"gen:{name}" for name in names]
+    values, missing = _l1_lookup(keys)
+    results = _run(lambda pipe: pipe.mget([keys[i] for i in missing])) \
+        if missing else None
+
+    return _generations(keys, values, missing, results)
+
+
+async def get_generations_async(names):
+    if not CACHE_ENABLED:
+        return None
+
+    keys = [f"gen:{name}" for name in names]
+    values, missing = _l1_lookup(keys)
+    results = await _run_async(
+        lambda pipe: pipe.mget([keys[i] for i in missing])) if missing else None
+
+    return _generations(keys, values, missing, results)
+
+
+def _generation_key(namespace, generations, parts):
+    if generations is None:
+        return None
+    return ":".join([namespace, ".".join(map(str, generations)),
+                     *map(str, parts)])
+
+
+def generation_key(namespace, names, *parts):
+    """
+    Key namespace:<generations of names>:parts, or None when caching is off.
+    Bumping any of the names moves the namespace's lookups to new keys.
+    """
+    return _generation_key(namespace, get_generations(names), parts)
+
+
+async def generation_key_async(namespace, names, *parts):
+    return _generation_key(namespace, await get_generations_async(names), parts)
+
+
+def _bump_commands(keys):
+
+    def commands(pipe):
+        for key in keys:
+            pipe.incr(key)
+        _publish_invalidation(pipe, keys)
+
+    return commands
+
+
+def bump_generation(*names):
+    if not CACHE_ENABLED:
+        return False
+
+    keys = [f"gen:{name}" for name in names]
+    results = _run(_bump_commands(keys))
+    _evict(keys)
+    return results is not None
+
+
+async def bump_generation_async(*names):
+    if not CACHE_ENABLED:
+        return False
+
+    keys = [f"gen:{name}" for name in names]
+    results = await _run_async(_bump_commands(keys))
+    _evict(keys)
+    return results is not None
+
+
+# Fills: get_or_fill_async() loads a missing key once per worker (single
+# flight) and, across workers, under a short Redis lock while the others wait
+# for the value to appear. Entries are kept CACHE_STALE_TTL seconds past their
+# ttl; in that window they are still served while one request refreshes
+# them in the background. A fresh entry is also refreshed early, with a
+# probability rising as it nears expiry and with how long it takes to load
+# (XFetch), so a hot key is rarely seen missing at all.
+
+# Seconds between checks for the value a worker holding the lock fills
+FILL_POLL_INTERVAL = 0.05
+
+# Duration of the last fill of each namespace (the key up to its last ':')
+_fill_times = {}
+
+_async_flights = {}
+_refreshing = set()
+_refresh_tasks = set()
+_fills_lock = threading.Lock()
+
+
+def _namespace(key):
+    return key.rsplit(":", 1)[0]
+
+
+def _ttl_commands(key):
+
+    def commands(pipe):
+        pipe.get(key)
+        pipe.pttl(key)
+
+    return commands
+
+
+def _value_with_ttl(key, results):
+    """
+    Cached value of a key (_MISSING on a miss) and the seconds it has left,
+    None if unknown, from its GET and PTTL results.
+    """
+    if results is None:
+        return _MISSING, None
+    data, pttl = results
+    value = _decode(data)
+    if value is _MISSING:
+        _count_l2(0, 1)
+        return _MISSING, None
+    _count_l2(1, 0)
+    local_cache.set(key, data)
+    return value, pttl / 1000 if pttl >= 0 else None
+
+
+async def _read_with_ttl_async(key):
+    data = local_cache.get(key)
+    if data is not None:
+        return _decode(data), None
+    return _value_with_ttl(key, await _run_async(_ttl_commands(key)))
+
+
+def _needs_refresh(key, seconds_left, stale_ttl):
+    if seconds_left is None:
+        return False
+    fresh_left = seconds_left - stale_ttl
+    if fresh_left <= 0:
+        return True
+    delta = _fill_times.get(_namespace(key), 0.0)
+    return (delta * settings.CACHE_EARLY_REFRESH_BETA *
+            -math.log(1.0 - random.random())) >= fresh_left
+
+
+def _lock_commands(key, token):
+
+    def commands(pipe):
+        pipe.set(f"lock:{key}", token, nx=True,
+                 px=int(settings.CACHE_FILL_LOCK_TIMEOUT * 1000))
+
+    return commands
+
+
+def _lock_token(token, results):
+    # Without Redis there is no lock to take: fill without it
+    if results is None:
+        return token
+    return token if results[0] else None
+
+
+async def _acquire_fill_lock_async(key):
+    """A token for releasing the fill lock of key, None if another worker holds it."""
+    token = uuid.uuid4().hex
+    return _lock_token(token, await _run_async(_lock_commands(key, token)))
+
+
+# Releasing is not atomic: a lock that expires between GET and DEL can be
+# released for its next holder, which costs at most one extra fill
+
+async def _release_fill_lock_async(key, token):
+    results = await _run_async(lambda pipe: pipe.get(f"lock:{key}"))
+    if results is not None and results[0] == token.encode():
+        await _run_async(lambda pipe: pipe.delete(f"lock:{key}"))
+
+
+def _poll_commands(key):
+
+    def commands(pipe):
+        pipe.get(key)
+        pipe.exists(f"lock:{key}")
+
+    return commands
+
+
+def _polled_value(key, results):
+    """
+    The value the lock holder cached, None while it holds the lock, or
+    _MISSING once it released the lock without caching one.
+    """
+    if results is None:
+        return _MISSING
+    data, locked = results
+    value = _decode(data)
+    if value is not _MISSING:
+        local_cache.set(key, data)
+        return value
+    return None if locked else _MISSING
+
+
+def _record_fill_time(key, started):
+    _fill_times[_namespace(key)] = time.monotonic() - started
+
+
+def _claim_refresh(key):
+    with _fills_lock:
+        if key in _refreshing:
+            return False
+        _refreshing.add(key)
+        return True
+
+
+def _end_refresh(key):
+    with _fills_lock:
+        _refreshing.discard(key)
+
+
+class _LeaderCancelled(Exception):
+    """Set on a fill's future when the task running the fill is cancelled."""
+
+
+async def _single_flight_async(key, fill):
+    future = _async_flights.get(key)
+    while future is not None:
+        try:
+            return await asyncio.shield(future)
+        except _LeaderCancelled:
+            # The first waiter to wake up runs the fill, the rest await it
+            future = _async_flights.get(key)
+
+    future = asyncio.get_running_loop().create_future()
+    _async_flights[key] = future
+    try:
+        value = await fill()
+    except asyncio.CancelledError:
+        # Only this task is cancelled, not the callers waiting on it
+        future.set_exception(_LeaderCancelled())
+        future.exception()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # Retrieved here, so an exception nobody else awaited isn't logged
+        future.exception()
+        raise
+    else:
+        future.set_result(value)
+        return value
+    finally:
+        del _async_flights[key]
+
+
+async def _fill_async(key, loader, ttl, stale_ttl):
+    token = await _acquire_fill_lock_async(key)
+    if token is None:
+        deadline = time.monotonic() + settings.CACHE_FILL_LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(FILL_POLL_INTERVAL)
+            value = _polled_value(key, await _run_async(_poll_commands(key)))
+            if value is _MISSING:
+                break
+            if value is not None:
+                return value
+
+    try:
+        started = time.monotonic()
+        value = await loader()
+        _record_fill_time(key, started)
+        if value is not None:
+            await set_cached_async(key, value, ttl + stale_ttl)
+        return value
+    finally:
+        if token is not None:
+            await _release_fill_lock_async(key, token)
+
+
+async def _refresh_async(key, loader, ttl, stale_ttl):
+    try:
+        token = await _acquire_fill_lock_async(key)
+        if token is None:
+            return
+        try:
+            started = time.monotonic()
+            value = await loader()
+            _record_fill_time(key, started)
+            if value is not None:
+                await set_cached_async(key, value, ttl + stale_ttl)
+        finally:
+            await _release_fill_lock_async(key, token)
+    except Exception as e:
+        logger.warning(f"Cache refresh of {key} failed: {e}")
+    finally:
+        _end_refresh(key)
+
+
+async def get_or_fill_async(key, loader, ttl=CACHE_TTL, stale_ttl=None):
+    """
+    Cached value of key, or the result of await loader() cached under key
+    (None results are not cached). Concurrent callers of a missing key share
+    one loader() call and its result.
+    """
+    stale_ttl = settings.CACHE_STALE_TTL if stale_ttl is None else stale_ttl
+    if not CACHE_ENABLED:
+        return await _single_flight_async(key, loader)
+
+    value, seconds_left = await _read_with_ttl_async(key)
+    if value is not _MISSING:
+        if _needs_refresh(key, seconds_left, stale_ttl) and _claim_refresh(key):
+            task = asyncio.get_running_loop().create_task(
+                _refresh_async(key, loader, ttl, stale_ttl))
+            # The loop only keeps weak references to tasks
+            _refresh_tasks.add(task)
+            task.add_done_callback(_refresh_tasks.discard)
+        return value
+
+    return await _single_flight_async(
+        key, lambda: _fill_async(key, loader, ttl, stale_ttl))
+
+
+def cache_stats():
+    """Lookups served by each tier; L2 only sees the L1 misses."""
+    l2_lookups = _l2_stats["hits"] + _l2_stats["misses"]
+    return {
+        "enabled": CACHE_ENABLED,
+        "l1": local_cache.stats(),
+        "l2": {
+            "hits": _l2_stats["hits"],
+            "misses": _l2_stats["misses"],
+            "hit_ratio": _l2_stats["hits"] / l2_lookups if l2_lookups else None,
+        },
+        "breaker": breaker.status(),
+    }
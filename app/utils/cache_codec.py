@@ -0,0 +1,144 @@
+"""
+Encoding of cache values.
+
+A value is stored as a one-byte tag naming its format followed by the
+encoded body: b"j" JSON (written by the json or orjson codec, read by the
+fastest available) or b"m" MessagePack. Bodies of at least `compress_min_bytes`
+are zlib-compressed and tagged b"z" when that makes them smaller. Values
+without a tag are JSON written before tags existed.
+
+Every codec encodes datetimes, dates and times as ISO strings, Decimals as
+strings, Enums as their values and row records (app.db.rows) as dicts, so a value decodes the same whichever
+codec wrote it; the response schemas parse those strings back.
+"""
+import json
+import logging
+import zlib
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+
+from app.db.rows import Record
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+logger = logging.getLogger(__name__)
+
+TAG_JSON = b"j"
+TAG_MSGPACK = b"m"
+TAG_ZLIB = b"z"
+
+# Fast over small: cache values are compressed on every write
+COMPRESSION_LEVEL = 1
+
+
+def _default(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, Record):
+        return value._asdict()
+    raise TypeError(f"{type(value).__name__} is not serializable")
+
+
+class JsonCodec:
+    name = "json"
+    tag = TAG_JSON
+
+    def dumps(self, value) -> bytes:
+        return json.dumps(value, default=_default, separators=(",", ":")).encode()
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class OrjsonCodec:
+    name = "orjson"
+    tag = TAG_JSON
+
+    def dumps(self, value) -> bytes:
+        # Non-str keys become strings, like json.dumps
+        return orjson.dumps(value, default=_default,
+                            option=orjson.OPT_NON_STR_KEYS)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+class MsgpackCodec:
+    name = "msgpack"
+    tag = TAG_MSGPACK
+
+    def dumps(self, value) -> bytes:
+        return msgpack.packb(value, default=_default, use_bin_type=True)
+
+    def loads(self, data):
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+CODECS = {
+    "json": (JsonCodec, True),
+    "orjson": (OrjsonCodec, orjson is not None),
+    "msgpack": (MsgpackCodec, msgpack is not None),
+}
+
+
+def available_codecs():
+    return [name for name, (_, available) in CODECS.items() if available]
+
+
+def get_codec(name: str):
+    """The codec called name, or JSON if its library isn't installed."""
+    codec_class, available = CODECS.get(name, (None, False))
+    if codec_class is None:
+        raise ValueError(f"Unknown cache codec '{name}', use one of: "
+                         f"{', '.join(CODECS)}")
+    if not available:
+        logger.warning(f"Cache codec '{name}' is not installed, using json")
+        return JsonCodec()
+    return codec_class()
+
+
+class CacheCodec:
+
+    def __init__(self, codec, compress_min_bytes: int = 0):
+        self.codec = codec
+        # 0: never compress
+        self.compress_min_bytes = compress_min_bytes
+        self._decoders = {TAG_JSON: (OrjsonCodec if orjson is not None
+                                     else JsonCodec)()}
+        if msgpack is not None:
+            self._decoders[TAG_MSGPACK] = MsgpackCodec()
+
+    def encode(self, value) -> bytes:
+        data = self.codec.tag + self.codec.dumps(value)
+        if self.compress_min_bytes and len(data) >= self.compress_min_bytes:
+            compressed = TAG_ZLIB + zlib.compress(data, COMPRESSION_LEVEL)
+            if len(compressed) < len(data):
+                return compressed
+        return data
+
+    def decode(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        if data[:1] == TAG_ZLIB:
+            data = zlib.decompress(data[1:])
+
+        decoder = self._decoders.get(data[:1])
+        if decoder is None:
+            if data[:1] == TAG_MSGPACK:
+                raise ValueError("msgpack is not installed")
+            return json.loads(data)
+        return decoder.loads(data[1:])
@@ -0,0 +1,73 @@
+"""
+Circuit breaker for a dependency the app can run without, such as Redis.
+
+Closed: calls go through and consecutive failures are counted; reaching
+`failure_threshold` opens the breaker. Open: calls fail fast, except one
+probe every `reset_timeout` seconds (half-open). A probe that succeeds
+closes the breaker, one that fails keeps it open.
+"""
+import logging
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+
+
+class CircuitBreaker:
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.last_error = None
+        self._next_probe = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether to make a call now: always when closed, one probe per
+        reset_timeout when open."""
+        if self.state == CLOSED:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            if self.state == CLOSED or now >= self._next_probe:
+                self._next_probe = now + self.reset_timeout
+                return True
+            return False
+
+    def success(self) -> None:
+        # Lock-free when nothing changes, since every call reports
+        if self.state == CLOSED and not self.failures:
+            return
+        with self._lock:
+            if self.state == OPEN:
+                logger.info(f"{self.name} is back, circuit closed")
+            self.state = CLOSED
+            self.failures = 0
+            self.opened_at = None
+
+    def failure(self, error) -> None:
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error)
+            if self.state == CLOSED and self.failures >= self.failure_threshold:
+                logger.warning(f"{self.name} failed {self.failures} times, circuit "
+                               f"open for {self.reset_timeout}s: {error}")
+                self.state = OPEN
+                self.opened_at = time.time()
+                self._next_probe = time.monotonic() + self.reset_timeout
+
+    def status(self):
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "opened_at": self.opened_at,
+            "last_error": self.last_error,
+        }
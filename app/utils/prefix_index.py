@@ -0,0 +1,218 @@
+"""
+In-memory prefix index for typeahead suggestions.
+
+Entries are (text, id) pairs kept in the order of their normalized text, so
+the entries starting with a prefix are a contiguous run found by binary
+search. Most entries live in an immutable base: every text concatenated into
+one string, with array-backed offsets and ids, which costs a few bytes per
+entry instead of a str object each. Writes go to a small sorted delta and
+remove entries by id through tombstones; both are merged into a new base
+once they grow past `merge_threshold`.
+
+A search reads the current state, a (base, tombstones, delta, version)
+tuple, with one attribute load and runs without the lock. Writers serialize
+on the lock, copy the delta on write and publish a new state; tombstones are
+added in place, tagged with the version that added them, so a search ignores
+those newer than its state. A merge builds the new base from a snapshot
+outside the lock, then swaps it in under the lock together with the writes
+made while it was building.
+"""
+import bisect
+import heapq
+import threading
+from array import array
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.casefold().split())
+
+
+def _removed(removed, version, entry_id) -> bool:
+    """Whether a tombstone from `version` or before hides entry_id."""
+    return removed.get(entry_id, version + 1) <= version
+
+
+class _Base:
+    """Immutable sorted entries: texts in one string, offsets and ids in arrays."""
+
+    def __init__(self, entries):
+        # entries: sorted (key, id, text)
+        self.texts = "".join(text for _, _, text in entries)
+        self.offsets = array("L", [0])
+        self.ids = array("I")
+        for _, entry_id, text in entries:
+            self.offsets.append(self.offsets[-1] + len(text))
+            self.ids.append(entry_id)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def text(self, i: int) -> str:
+        return self.texts[self.offsets[i]:self.offsets[i + 1]]
+
+    def key(self, i: int) -> str:
+        return normalize(self.text(i))
+
+    def lower_bound(self, key: str, lo: int = 0) -> int:
+        hi = len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def upper_bound(self, key: str, lo: int = 0) -> int:
+        hi = len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if key < self.key(mid):
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def entries(self):
+        for i in range(len(self)):
+            text = self.text(i)
+            yield normalize(text), self.ids[i], text
+
+
+class PrefixIndex:
+    """
+    Sorted (text, id) entries answering "first `limit` texts starting with
+    a prefix", case- and whitespace-insensitively.
+
+    An id has at most one entry; add() replaces it. With distinct=True each
+    normalized text is returned once (e.g. an author of many books).
+    """
+
+    def __init__(self, distinct: bool = False, merge_threshold: int = 10000):
+        self.distinct = distinct
+        self.merge_threshold = merge_threshold
+        # base, tombstones (id -> version that removed its base entry),
+        # delta (sorted (key, id, text)) and version
+        self._state = (_Base([]), {}, [], 0)
+        self._merging = False
+        self._written = set()  # ids written while a merge is building
+        self._lock = threading.Lock()
+
+    def build(self, items) -> None:
+        """Replace the contents with (text, id) items, e.g. a table scan."""
+        entries = sorted((normalize(text), entry_id, text)
+                         for text, entry_id in items if text)
+        base = _Base(entries)
+        with self._lock:
+            self._state = (base, {}, [], 0)
+
+    def add(self, text: str, entry_id: int) -> None:
+        self.add_many([(text, entry_id)])
+
+    def add_many(self, items) -> None:
+        """add() for many (text, id) items, copying the delta once."""
+        entries = {entry_id: (normalize(text), entry_id, text)
+                   for text, entry_id in items}
+        self._write(entries.keys(),
+                    [entry for entry in entries.values() if entry[2]])
+
+    def remove(self, entry_id: int) -> None:
+        self._write({entry_id}, [])
+
+    def _write(self, ids, entries):
+        with self._lock:
+            base, removed, delta, version = self._state
+            version += 1
+            delta = [entry for entry in delta if entry[1] not in ids]
+            delta.extend(entries)
+            delta.sort()
+            # The base may or may not hold the id; a tombstone hides it
+            # either way
+            for entry_id in ids:
+                removed.setdefault(entry_id, version)
+            if self._merging:
+                self._written.update(ids)
+            self._state = (base, removed, delta, version)
+            snapshot = self._merge_snapshot()
+
+        if snapshot is not None:
+            self._merge(snapshot)
+
+    def _merge_snapshot(self):
+        base, removed, delta, version = self._state
+        if self._merging or \
+                len(delta) + len(removed) < self.merge_threshold:
+            return None
+        self._merging = True
+        self._written = set()
+        return self._state
+
+    def _merge(self, snapshot):
+        base, removed, delta, version = snapshot
+        try:
+            live = (entry for entry in base.entries()
+                    if not _removed(removed, version, entry[1]))
+            merged = _Base(list(heapq.merge(live, delta)))
+        except BaseException:
+            with self._lock:
+                self._merging = False
+            raise
+
+        with self._lock:
+            self._merging = False
+            written, self._written = self._written, set()
+            current_base, _, current_delta, current_version = self._state
+            # build() replaced the contents while the merge was building
+            if current_base is not base:
+                return
+            # Writes made while building: their tombstones hide what they
+            # replaced in the new base, their entries stay in the delta
+            current_version += 1
+            self._state = (
+                merged,
+                dict.fromkeys(written, current_version),
+                [entry for entry in current_delta if entry[1] in written],
+                current_version,
+            )
+
+    def _base_matches(self, base, removed, version, key):
+        i = base.lower_bound(key)
+        while i < len(base):
+            text = base.text(i)
+            entry_key = normalize(text)
+            if not entry_key.startswith(key):
+                return
+            if _removed(removed, version, base.ids[i]):
+                i += 1
+                continue
+            yield entry_key, base.ids[i], text
+            # Skip the other entries with the same text
+            i = base.upper_bound(entry_key, i + 1) if self.distinct else i + 1
+
+    def _delta_matches(self, delta, key):
+        for i in range(bisect.bisect_left(delta, (key,)), len(delta)):
+            if not delta[i][0].startswith(key):
+                return
+            yield delta[i]
+
+    def search(self, prefix: str, limit: int = 10):
+        """The first `limit` (text, id) entries starting with prefix."""
+        key = normalize(prefix)
+        if not key or limit <= 0:
+            return []
+
+        base, removed, delta, version = self._state
+
+        results = []
+        last_key = None
+        for entry_key, entry_id, text in heapq.merge(
+                self._base_matches(base, removed, version, key),
+                self._delta_matches(delta, key)):
+            if self.distinct and entry_key == last_key:
+                continue
+            last_key = entry_key
+            results.append((text, entry_id))
+            if len(results) == limit:
+                break
+
+        return results
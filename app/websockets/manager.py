@@ -1,7 +1,8 @@
 from typing import Dict, Any
 import logging
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, status
-from app.db.database import sql
+from app.db.database import sql_async
+from app.db.loaders import Loader
 from fastapi import APIRouter
 
 # Create the WebSocket router
@@ -12,26 +13,35 @@ logger = logging.getLogger(__name__)
 # Store active connections
 active_connections: Dict[str, WebSocket] = {}
 
+# Notification channels of many users in one query
+user_channels = Loader(
+    "SELECT id, websocket_connection_id FROM users WHERE id IN :keys")
 
-async def notify_user(user_id: int, message: Dict[str, Any]):
-    # Get the user's channel ID
-    user = sql("SELECT websocket_connection_id FROM users WHERE id = :user_id",
-               user_id=user_id
-               ).dict()
 
-    if not user or not user.websocket_connection_id:
+async def _send(channel_id, message: Dict[str, Any]):
+
+    if not channel_id or channel_id not in active_connections:
+        return False
+
+    try:
+        await active_connections[channel_id].send_json(message)
+        return True
+    except Exception as e:
+        logger.error(f"Failed to send WebSocket message: {str(e)}")
         return False
 
-    channel_id = user.websocket_connection_id
 
-    if channel_id in active_connections:
-        try:
-            await active_connections[channel_id].send_json(message)
-            return True
-        except Exception as e:
-            logger.error(f"Failed to send WebSocket message: {str(e)}")
-            return False
-    return False
+async def notify_users(messages: Dict[int, Dict[str, Any]]):
+    """
+    Send each user (by id) their message; channels are looked up in one query.
+    """
+    users = await user_channels.load_many_async(messages)
+
+    return {
+        user_id: await _send(users[user_id]['websocket_connection_id'], message)
+        if user_id in users else False
+        for user_id, message in messages.items()
+    }
 
 
 @websocket_router.websocket("/ws/{channel_id}")
@@ -43,13 +53,13 @@ async def websocket_endpoint(
     await websocket.accept()
 
     try:
-        user = sql("""
+        user = (await sql_async("""
                 SELECT id, email, first_name, last_name 
                 FROM users 
                 WHERE websocket_connection_id = :channel_id AND is_active = TRUE
             """,
-                   channel_id=channel_id
-                   ).dict()
+                                channel_id=channel_id
+                                )).dict()
 
         if not user:
             await websocket.send_json({"error": "Invalid channel ID"})
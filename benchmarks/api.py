@@ -0,0 +1,172 @@
+"""
+Run the API in-process and report latency and queries per request by endpoint.
+
+The app runs against a throwaway in-memory SQLite database unless
+DATABASE_URL is already set, so it needs no MySQL server. Query counts come
+from the Server-Timing header set by the query log middleware. With --check
+the run exits non-zero when an endpoint issues more queries per request than
+its budget, so CI catches N+1 and query-count regressions before deploy.
+
+Usage:
+    python -m benchmarks.api --books 1000 --requests 200 --check
+"""
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+# Every request comes from the same client address
+os.environ.setdefault("RATE_LIMIT_PER_MINUTE", "1000000000")
+
+import argparse  # noqa: E402
+import re  # noqa: E402
+import sys  # noqa: E402
+import time  # noqa: E402
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.db.seed_data import seed_bulk_books  # noqa: E402
+from app.main import app  # noqa: E402
+from app.services.suggest import build_suggest_index  # noqa: E402
+
+
+API = settings.API_V1_STR
+
+# Most queries one request of each scenario may issue (checked by --check)
+QUERY_BUDGETS = {
+    "search": 4,
+    "search_title": 4,
+    "search_text": 4,
+    "search_facets": 4,
+    "search_facets_filtered": 4,
+    "suggest": 1,
+    "get_book": 2,
+    "get_books_batch": 3,
+    "borrow_return": 17,
+    "history": 4,
+}
+
+_SERVER_TIMING = re.compile(r'dur=([\d.]+);desc="(\d+) queries"')
+
+
+def scenarios(books):
+    def search(client, i):
+        return [client.get(f"{API}/books", params={"limit": 20, "page": i % 10})]
+
+    def search_title(client, i):
+        return [client.get(f"{API}/books",
+                           params={"title": f"Bulk Book {i % 100}", "limit": 20})]
+
+    def search_text(client, i):
+        return [client.get(f"{API}/books",
+                           params={"q": f"book {i % 100}", "limit": 20})]
+
+    def search_facets(client, i):
+        return [client.get(f"{API}/books",
+                           params={"facets": True, "limit": 20, "page": i % 10})]
+
+    def search_facets_filtered(client, i):
+        return [client.get(f"{API}/books", params={
+            "facets": True, "author": f"Author {i % 100}", "limit": 20})]
+
+    def suggest(client, i):
+        return [client.get(f"{API}/books/suggest", params={"q": f"bulk book {i % 100}"})]
+
+    def get_book(client, i):
+        return [client.get(f"{API}/books/{i % books + 1}")]
+
+    def get_books_batch(client, i):
+        ids = ",".join(str((i * 40 + n) % books + 1) for n in range(40))
+        return [client.get(f"{API}/books/batch", params={"ids": ids})]
+
+    def history(client, i):
+        return [client.get(f"{API}/borrow/history", params={"limit": 20})]
+
+    def borrow_return(client, i):
+        borrowed = client.post(f"{API}/borrow", json={
+            "book_id": i % books + 1, "due_date": "2099-01-01T00:00:00"})
+        returned = client.post(f"{API}/borrow/return",
+                               json={"borrow_id": borrowed.json()["id"]})
+        return [borrowed, returned]
+
+    return {
+        "search": search,
+        "search_title": search_title,
+        "search_text": search_text,
+        "search_facets": search_facets,
+        "search_facets_filtered": search_facets_filtered,
+        "suggest": suggest,
+        "get_book": get_book,
+        "get_books_batch": get_books_batch,
+        # After borrow_return, so the history has records to load
+        "borrow_return": borrow_return,
+        "history": history,
+    }
+
+
+def login(client):
+    response = client.post(f"{API}/auth/login", json={
+        "email": "admin@library.com", "password": "admin123"})
+    response.raise_for_status()
+    client.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+
+
+def measure(client, scenario, requests):
+    latencies, queries, db_time = [], [], 0.0
+    for i in range(requests):
+        start = time.perf_counter()
+        responses = scenario(client, i)
+        latencies.append(time.perf_counter() - start)
+
+        count = 0
+        for response in responses:
+            response.raise_for_status()
+            dur, n = _SERVER_TIMING.search(
+                response.headers["Server-Timing"]).groups()
+            count += int(n)
+            db_time += float(dur) / 1000
+        queries.append(count)
+
+    latencies.sort()
+    return {
+        "p50": latencies[len(latencies) // 2],
+        "p99": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+        "db": db_time / requests,
+        "queries": max(queries),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--books", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--check", action="store_true",
+                        help="fail when an endpoint exceeds its query budget")
+    args = parser.parse_args()
+
+    over_budget = []
+    # Entering the client runs the startup hook (schema and seed data)
+    with TestClient(app) as client:
+        seed_bulk_books(args.books)
+        build_suggest_index()
+        login(client)
+
+        print(f"{settings.DATABASE_URL.split(':')[0]}, {args.books} bulk books, "
+              f"{args.requests} requests per endpoint")
+        for name, scenario in scenarios(args.books).items():
+            result = measure(client, scenario, args.requests)
+            budget = QUERY_BUDGETS[name]
+            flag = "" if result["queries"] <= budget else "  OVER BUDGET"
+            if flag:
+                over_budget.append(name)
+            print(f"{name:<22} p50 {result['p50'] * 1000:>8.2f} ms"
+                  f"  p99 {result['p99'] * 1000:>8.2f} ms"
+                  f"  db {result['db'] * 1000:>7.2f} ms"
+                  f"  queries {result['queries']:>3}/{budget}{flag}")
+
+    if args.check and over_budget:
+        print(f"Query budget exceeded: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
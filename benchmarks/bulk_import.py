@@ -0,0 +1,86 @@
+"""
+Measure the throughput of the bulk book import (POST /books/import).
+
+Generates a CSV or JSONL shipment of new titles, uploads it through the API
+in-process and reports books per second and queries issued. Like
+benchmarks.api it runs against an in-memory SQLite database unless
+DATABASE_URL is set.
+
+Usage:
+    python -m benchmarks.bulk_import --books 20000 --format csv
+"""
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("RATE_LIMIT_PER_MINUTE", "1000000000")
+
+import argparse  # noqa: E402
+import csv  # noqa: E402
+import io  # noqa: E402
+import json  # noqa: E402
+import re  # noqa: E402
+import time  # noqa: E402
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.main import app  # noqa: E402
+from benchmarks.api import login  # noqa: E402
+
+
+API = settings.API_V1_STR
+
+_SERVER_TIMING = re.compile(r'desc="(\d+) queries"')
+
+
+def shipment(count: int, file_format: str) -> bytes:
+    rows = [{
+        "isbn": f"IMPORT-{n:010d}",
+        "location": f"Shelf {n % 500}",
+        "title": f"Imported Book {n}",
+        "author": f"Import Author {n % 3000}",
+        "publisher": f"Publisher {n % 200}",
+        "publication_year": 1950 + n % 75,
+        "categories": ["Fiction", "Science"][:n % 3],
+    } for n in range(count)]
+
+    if file_format == "jsonl":
+        return "".join(json.dumps(row) + "\n" for row in rows).encode()
+
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=list(rows[0]))
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(dict(row, categories="|".join(row["categories"])))
+    return out.getvalue().encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--books", type=int, default=20000)
+    parser.add_argument("--format", choices=("csv", "jsonl"), default="csv")
+    args = parser.parse_args()
+
+    content = shipment(args.books, args.format)
+
+    with TestClient(app) as client:
+        login(client)
+
+        start = time.perf_counter()
+        response = client.post(
+            f"{API}/books/import",
+            files={"file": (f"shipment.{args.format}", content)})
+        elapsed = time.perf_counter() - start
+        response.raise_for_status()
+
+    result = response.json()
+    queries = _SERVER_TIMING.search(response.headers["Server-Timing"]).group(1)
+    print(f"{settings.DATABASE_URL.split(':')[0]}, {args.books} rows "
+          f"({len(content) / 1e6:.1f} MB {args.format})")
+    print(f"{result['books_created']} books created, {result['failed']} failed "
+          f"in {elapsed:.2f} s: {args.books / elapsed:,.0f} books/s, "
+          f"{queries} queries")
+
+
+if __name__ == "__main__":
+    main()
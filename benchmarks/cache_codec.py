@@ -0,0 +1,105 @@
+"""
+Compare the cache codecs (app.utils.cache_codec) with the plain
+json.dumps(default=str) encoding cache values used before.
+
+Encodes book-shaped payloads (a book, a page of categories, a batch of 100
+books) with each installed codec, with and without compression, and reports
+encode/decode throughput and stored size. Needs no Redis or database; what
+the codecs store is checked by tests/test_cache_codec.py.
+
+Usage:
+    python -m benchmarks.cache_codec --seconds 0.5
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from enum import Enum
+
+from app.utils.cache_codec import CacheCodec, available_codecs, get_codec
+
+
+class Status(str, Enum):
+    AVAILABLE = "available"
+    BORROWED = "borrowed"
+
+
+def book(n):
+    created = datetime(2024, 1, 1, 9, 30) + timedelta(days=n, microseconds=n)
+    return {
+        "id": n,
+        "title": f"The Book Number {n}",
+        "author": f"Author {n % 300}",
+        "publisher": f"Publisher {n % 40}",
+        "publication_year": 1950 + n % 75,
+        "description": "A library book description. " * 8,
+        "total_quantity": 3,
+        "available_quantity": n % 4,
+        "created_at": created,
+        "updated_at": created + timedelta(hours=n % 24),
+        "categories": [{"id": c, "name": f"Category {c}"}
+                       for c in range(n % 4)],
+    }
+
+
+def payloads():
+    return {
+        "book": book(7),
+        "categories": {
+            "items": [{"id": c, "name": f"Category {c}", "book_count": c * 17,
+                       "created_at": datetime(2024, 1, 1),
+                       "updated_at": datetime(2024, 2, 1)}
+                      for c in range(50)],
+            "total": 50, "page": 0, "limit": 50,
+        },
+        "book_batch": [book(n) for n in range(100)],
+        "loan": {"id": 1, "status": Status.BORROWED, "fine": Decimal("2.50"),
+                 "due_date": datetime(2024, 3, 1).date()},
+    }
+
+
+def baseline_dumps(value):
+    return json.dumps(value, default=str).encode()
+
+
+def rate(fn, value, seconds):
+    """Calls per second of fn(value) over about `seconds`."""
+    calls, start = 0, time.perf_counter()
+    while True:
+        for _ in range(50):
+            fn(value)
+        calls += 50
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            return calls / elapsed
+
+
+def codecs(compress_min_bytes):
+    for name in available_codecs():
+        yield name, CacheCodec(get_codec(name))
+        yield f"{name}+zlib", CacheCodec(get_codec(name), compress_min_bytes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=0.5,
+                        help="measuring time per codec and payload")
+    parser.add_argument("--compress-min-bytes", type=int, default=4096)
+    args = parser.parse_args()
+
+    for payload_name, value in payloads().items():
+        print(f"\n{payload_name}")
+        encoded = baseline_dumps(value)
+        print(f"  {'json (before)':<14} encode {rate(baseline_dumps, value, args.seconds):>10,.0f}/s"
+              f"  decode {rate(json.loads, encoded, args.seconds):>10,.0f}/s"
+              f"  {len(encoded):>7} bytes")
+        for codec_name, codec in codecs(args.compress_min_bytes):
+            encoded = codec.encode(value)
+            print(f"  {codec_name:<14} encode {rate(codec.encode, value, args.seconds):>10,.0f}/s"
+                  f"  decode {rate(codec.decode, encoded, args.seconds):>10,.0f}/s"
+                  f"  {len(encoded):>7} bytes")
+
+
+if __name__ == "__main__":
+    main()
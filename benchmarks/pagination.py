@@ -0,0 +1,71 @@
+"""
+Compare OFFSET and cursor (keyset) pagination of search_books at depth.
+
+Seeds --books bulk books into the configured database (in-memory SQLite
+unless DATABASE_URL is set) and times fetching the page that starts at each
+depth, both ways. Totals are skipped so only the page query is measured.
+
+Usage:
+    python -m benchmarks.pagination --books 200000 --limit 20
+"""
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import argparse  # noqa: E402
+import asyncio  # noqa: E402
+import time  # noqa: E402
+
+from app.db.database import async_engine, sql  # noqa: E402
+from app.db.init_db import init_db  # noqa: E402
+from app.db.seed_data import seed_bulk_books  # noqa: E402
+from app.schemas.book import BookSearchParams  # noqa: E402
+from app.services import books as book_service  # noqa: E402
+
+
+async def timed(params, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await book_service.search_books_async(params)
+    return (time.perf_counter() - start) / repeat
+
+
+def cursor_at(depth):
+    # The cursor a client would hold after paging to this depth
+    book = sql("SELECT title, id FROM books ORDER BY title, id "
+               "LIMIT 1 OFFSET :offset", offset=depth - 1).dict()
+    return book_service._encode_cursor(book)
+
+
+async def run(args):
+    print(f"{args.books} books, {args.limit} per page")
+    depths = [args.limit * 10 ** n for n in range(10)
+              if args.limit * 10 ** n < args.books - args.limit]
+    for depth in depths + [args.books - args.limit]:
+        page = depth // args.limit
+        offset_time = await timed(BookSearchParams(
+            page=page, limit=args.limit, include_total=False), args.repeat)
+        cursor_time = await timed(BookSearchParams(
+            cursor=cursor_at(depth), limit=args.limit, include_total=False),
+            args.repeat)
+        print(f"row {depth:>9}  offset {offset_time * 1000:>8.2f} ms"
+              f"  cursor {cursor_time * 1000:>8.2f} ms")
+
+    await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--books", type=int, default=200000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    init_db()
+    seed_bulk_books(args.books)
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Compare the row types returned by SQLHelper: dicts, tuples and records.
+
+Builds an in-memory SQLite table shaped like borrow_records and reports
+rows/sec and retained bytes per row for each accessor. Needs no MySQL.
+
+Usage:
+    python -m benchmarks.row_types --rows 100000
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from datetime import datetime
+
+from sqlalchemy import create_engine, text
+
+from app.db.database import SQLHelper
+
+
+QUERY = "SELECT * FROM borrow_records"
+
+
+def setup(rows):
+    engine = create_engine("sqlite://")
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE borrow_records (
+                id INTEGER PRIMARY KEY, user_id INTEGER, book_item_id INTEGER,
+                borrowed_date TIMESTAMP, due_date TIMESTAMP,
+                returned_date TIMESTAMP, status VARCHAR(20),
+                created_at TIMESTAMP, updated_at TIMESTAMP)
+        """))
+        conn.execute(text("""
+            INSERT INTO borrow_records
+            (user_id, book_item_id, borrowed_date, due_date, returned_date,
+             status, created_at, updated_at)
+            VALUES (:user_id, :book_item_id, :now, :now, NULL, 'active', :now, :now)
+        """), [{"user_id": i % 1000, "book_item_id": i, "now": now}
+               for i in range(rows)])
+    return engine
+
+
+def measure(engine, accessor):
+    with engine.connect() as conn:
+        # Warm up (record classes are generated on first use)
+        getattr(SQLHelper(conn.execute(text(QUERY + " LIMIT 10"))), accessor)()
+
+        start = time.perf_counter()
+        rows = getattr(SQLHelper(conn.execute(text(QUERY))), accessor)()
+        elapsed = time.perf_counter() - start
+
+        del rows
+        gc.collect()
+        tracemalloc.start()
+        rows = getattr(SQLHelper(conn.execute(text(QUERY))), accessor)()
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return len(rows) / elapsed, size / len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    engine = setup(args.rows)
+    print(f"{args.rows} rows")
+    for accessor in ("dicts", "tuples", "records"):
+        rows_per_sec, bytes_per_row = measure(engine, accessor)
+        print(f"{accessor:<8} {rows_per_sec:>12,.0f} rows/s"
+              f"  {bytes_per_row:>8.1f} bytes/row")
+
+
+if __name__ == "__main__":
+    main()
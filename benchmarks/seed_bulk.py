@@ -0,0 +1,29 @@
+"""
+Time the bulk seeder against the configured database.
+
+Usage:
+    python -m benchmarks.seed_bulk --books 100000 --copies 5
+"""
+import argparse
+import time
+
+from app.db.seed_data import seed_bulk_books
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--books", type=int, default=100000)
+    parser.add_argument("--copies", type=int, default=5)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    seed_bulk_books(args.books, args.copies)
+    elapsed = time.perf_counter() - start
+
+    rows = args.books * (args.copies + 2)
+    print(f"{args.books} books, {args.books * args.copies} copies in "
+          f"{elapsed:.2f} s ({rows / elapsed:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import json
+import zlib
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+
+import pytest
+
+from app.db.rows import record_type
+from app.utils import cache_codec
+from app.utils.cache_codec import (
+    CacheCodec, JsonCodec, TAG_JSON, TAG_MSGPACK, TAG_ZLIB, available_codecs,
+    get_codec,
+)
+
+
+class Status(str, Enum):
+    BORROWED = "borrowed"
+
+
+class Level(Enum):
+    HIGH = 3
+
+
+VALUE = {
+    "id": 7,
+    "title": "Dune",
+    "created_at": datetime(2024, 1, 2, 9, 30, 5, 123),
+    "due_date": date(2024, 3, 1),
+    "opens_at": time(8, 15),
+    "fine": Decimal("2.50"),
+    "status": Status.BORROWED,
+    "level": Level.HIGH,
+    "categories": [{"id": 1, "name": "Fiction"}],
+    "description": None,
+}
+
+# What every codec must store for VALUE, written out by hand
+EXPECTED = {
+    "id": 7,
+    "title": "Dune",
+    "created_at": "2024-01-02T09:30:05.000123",
+    "due_date": "2024-03-01",
+    "opens_at": "08:15:00",
+    "fine": "2.50",
+    "status": "borrowed",
+    "level": 3,
+    "categories": [{"id": 1, "name": "Fiction"}],
+    "description": None,
+}
+
+CODECS = available_codecs()
+
+
+def _body(name, data: bytes):
+    """Decode a tagged body with the format's reference library, not the
+    codec under test."""
+    if data[:1] == TAG_MSGPACK:
+        assert name == "msgpack"
+        return cache_codec.msgpack.unpackb(data[1:], raw=False)
+    assert data[:1] == TAG_JSON
+    return json.loads(data[1:])
+
+
+@pytest.mark.parametrize("name", CODECS)
+def test_encodes_expected_forms(name):
+    data = CacheCodec(get_codec(name)).encode(VALUE)
+
+    assert _body(name, data) == EXPECTED
+
+
+@pytest.mark.parametrize("name", CODECS)
+def test_round_trip(name):
+    codec = CacheCodec(get_codec(name))
+
+    assert codec.decode(codec.encode(VALUE)) == EXPECTED
+
+
+@pytest.mark.parametrize("name", CODECS)
+def test_compresses_large_values(name):
+    value = {"books": [VALUE] * 200}
+    codec = CacheCodec(get_codec(name), compress_min_bytes=1024)
+
+    data = codec.encode(value)
+
+    assert data[:1] == TAG_ZLIB
+    assert _body(name, zlib.decompress(data[1:])) == {"books": [EXPECTED] * 200}
+    assert codec.decode(data) == {"books": [EXPECTED] * 200}
+
+
+@pytest.mark.parametrize("name", CODECS)
+def test_small_values_stay_uncompressed(name):
+    codec = CacheCodec(get_codec(name), compress_min_bytes=1024)
+
+    data = codec.encode({"id": 1})
+
+    assert data[:1] != TAG_ZLIB
+    assert codec.decode(data) == {"id": 1}
+
+
+@pytest.mark.parametrize("writer", CODECS)
+@pytest.mark.parametrize("reader", CODECS)
+def test_values_decode_whichever_codec_wrote_them(writer, reader):
+    data = CacheCodec(get_codec(writer), compress_min_bytes=64).encode(VALUE)
+
+    assert CacheCodec(get_codec(reader)).decode(data) == EXPECTED
+
+
+@pytest.mark.parametrize("name", CODECS)
+def test_reads_untagged_json(name):
+    legacy = json.dumps({"id": 1, "title": "Legacy"}, default=str)
+
+    assert CacheCodec(get_codec(name)).decode(legacy) == {"id": 1, "title": "Legacy"}
+    assert CacheCodec(get_codec(name)).decode(legacy.encode()) == \
+        {"id": 1, "title": "Legacy"}
+
+
+@pytest.mark.parametrize("name", CODECS)
+def test_encodes_records_as_dicts(name):
+    row = record_type(["id", "name", "created_at"])(
+        1, "Fiction", datetime(2024, 1, 2))
+    codec = CacheCodec(get_codec(name))
+
+    assert codec.decode(codec.encode({"categories": [row]})) == \
+        {"categories": [{"id": 1, "name": "Fiction",
+                         "created_at": "2024-01-02T00:00:00"}]}
+
+
+@pytest.mark.parametrize("name", CODECS)
+def test_rejects_unknown_types(name):
+    with pytest.raises(TypeError):
+        CacheCodec(get_codec(name)).encode({"value": object()})
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        get_codec("pickle")
+
+
+def test_missing_library_falls_back_to_json(monkeypatch):
+    monkeypatch.setitem(cache_codec.CODECS, "orjson",
+                        (cache_codec.OrjsonCodec, False))
+
+    assert isinstance(get_codec("orjson"), JsonCodec)
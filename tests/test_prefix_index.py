@@ -0,0 +1,80 @@
+import pytest
+
+from app.utils import prefix_index
+from app.utils.prefix_index import PrefixIndex
+
+
+def texts(index, prefix, limit=100):
+    return [text for text, _ in index.search(prefix, limit)]
+
+
+def test_search_is_case_and_whitespace_insensitive():
+    index = PrefixIndex()
+    index.build([("The  Hobbit", 1), ("the hours", 2), ("Dune", 3)])
+
+    assert texts(index, "THE h") == ["The  Hobbit", "the hours"]
+    assert texts(index, "the", limit=1) == ["The  Hobbit"]
+    assert texts(index, "  ") == []
+
+
+def test_distinct_returns_each_text_once():
+    index = PrefixIndex(distinct=True)
+    index.build([("Tolkien", 1), ("Tolkien", 2), ("tolkien", 3)])
+    index.add("Tolkien", 4)
+
+    assert texts(index, "tol") == ["Tolkien"]
+
+
+@pytest.mark.parametrize("merge_threshold", [1000, 1])
+def test_writes_replace_and_remove_entries(merge_threshold):
+    index = PrefixIndex(merge_threshold=merge_threshold)
+    index.build([("Dune", 1), ("Dracula", 2)])
+
+    index.add("Dune Messiah", 1)
+    index.remove(2)
+    index.add_many([("Dubliners", 3), ("Dracula", 4)])
+    index.add("", 3)
+
+    assert index.search("d") == [("Dracula", 4), ("Dune Messiah", 1)]
+
+
+def test_merge_keeps_writes_made_while_building(monkeypatch):
+    index = PrefixIndex(merge_threshold=4)
+    index.build([("Dune", 1), ("Dracula", 2)])
+    original = prefix_index._Base
+
+    class WritingBase(original):
+        def __init__(self, entries):
+            # The merge builds without the lock, so writes can interleave
+            monkeypatch.setattr(prefix_index, "_Base", original)
+            index.add("Dune Messiah", 1)
+            index.remove(3)
+            index.add("Emma", 5)
+            super().__init__(entries)
+
+    monkeypatch.setattr(prefix_index, "_Base", WritingBase)
+
+    index.add("Dubliners", 3)
+    index.add("Dracula", 4)  # reaches the threshold and merges
+
+    assert index.search("d") == [("Dracula", 2), ("Dracula", 4),
+                                 ("Dune Messiah", 1)]
+    assert index.search("e") == [("Emma", 5)]
+
+
+def test_build_during_a_merge_wins(monkeypatch):
+    index = PrefixIndex(merge_threshold=1)
+    original = prefix_index._Base
+
+    class RebuildingBase(original):
+        def __init__(self, entries):
+            monkeypatch.setattr(prefix_index, "_Base", original)
+            index.build([("Emma", 9)])
+            super().__init__(entries)
+
+    monkeypatch.setattr(prefix_index, "_Base", RebuildingBase)
+
+    index.add("Dune", 1)
+
+    assert texts(index, "e") == ["Emma"]
+    assert texts(index, "d") == []